@@ -225,7 +225,7 @@ def main():
                 print(f"\n{'='*60}")
                 print(f"📊 SUMMARY: {message_count} logs | {attack_count} attacks | {sequence_attacks} sequences")
                 
-                if ensemble.lstm_enabled:
+                if ensemble.lstm_loaded:
                     try:
                         top_attackers = ensemble.lstm_analyzer.get_top_attackers(3)
                         if top_attackers:
@@ -247,7 +247,7 @@ def main():
             print("[!] Shutting down consumer.")
             print(f"📊 Final Stats: {message_count} logs | {attack_count} attacks | {sequence_attacks} sequences")
             
-            if ensemble.lstm_enabled:
+            if ensemble.lstm_loaded:
                 try:
                     print(f"\n📋 ATTACK CAMPAIGN REPORT:")
                     report = ensemble.lstm_analyzer.generate_campaign_report()
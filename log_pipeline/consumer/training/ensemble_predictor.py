@@ -11,11 +11,17 @@ PERFORMANCE IMPROVEMENTS:
 6. Optional: Skip LSTM for speed
 """
 
+import os
 import numpy as np
 import joblib
 import json
+import threading
+import time
+from itertools import chain
 from pathlib import Path
-from datetime import datetime
+from joblib import Parallel, delayed
+import xgboost as xgb
+from feature_bins import bin_features
 
 # Optional LSTM import
 try:
@@ -25,6 +31,56 @@ except ImportError:
     LSTM_AVAILABLE = False
     print("   ⚠️  LSTM not available - sequence analysis disabled")
 
+# Optional ONNX Runtime backend for the Random Forest
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+# Optional TL2cgen runtime for the natively compiled Random Forest
+try:
+    import tl2cgen
+    TL2CGEN_AVAILABLE = True
+except ImportError:
+    TL2CGEN_AVAILABLE = False
+
+# Optional numba JIT for the scaling kernel
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Feature schema sizes
+N_BASIC_FEATURES = 4
+N_ADVANCED_FEATURES = 12
+
+PROTOCOL_MAP = {'tcp': 6, 'udp': 17, 'icmp': 1}
+
+# Below this many logs thread dispatch costs more than it saves
+PARALLEL_MIN_BATCH = 1000
+
+# BatchPredictor defaults: rows per model call / max queueing delay
+MICRO_BATCH_SIZE = 32
+MICRO_BATCH_FLUSH_MS = 5.0
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True, nogil=True)
+    def _scale_rows(X, mean, inv_scale, out):
+        """Standardize rows of X into out: (x - mean) * inv_scale"""
+        for i in range(X.shape[0]):
+            for j in range(X.shape[1]):
+                out[i, j] = (X[i, j] - mean[j]) * inv_scale[j]
+        return out
+else:
+    def _scale_rows(X, mean, inv_scale, out):
+        """Standardize rows of X into out: (x - mean) * inv_scale"""
+        np.subtract(X, mean, out=out)
+        np.multiply(out, inv_scale, out=out)
+        return out
+
 
 class MITREMapper:
     """Lightweight MITRE ATT&CK mapper"""
@@ -110,6 +166,20 @@ class PALADINEnsemble:
         self.lstm_enabled = False
         self.enable_lstm = enable_lstm  # Performance: Disable LSTM by default
         
+        # MITRE/LSTM are initialized lazily on the first non-NORMAL log
+        self._mitre_mapper = None
+        self._mitre_loader = None
+        self._lstm_analyzer = None
+        self._lstm_loader = None
+        # predict_batch_parallel workers may race on the first access
+        self._lazy_lock = threading.Lock()
+        
+        # Compiled inference backends (None -> pickled sklearn/XGBClassifier)
+        self.rf_native = None
+        self.rf_session = None
+        self.xgb_booster = None
+        self.xgb_bin_edges = None
+        
         self.load_models()
         self.load_mitre()
         if self.enable_lstm:
@@ -133,52 +203,187 @@ class PALADINEnsemble:
             self.rf_model.verbose = 0
             self.rf_model.n_jobs = 1  # Faster for single predictions
             
-            self.xgb_model = joblib.load(sup_dir / 'xgboost.pkl')
-            self.xgb_model.set_params(nthread=1, verbosity=0)  # Single-threaded
+            self.rf_native = self._load_rf_native(sup_dir)
+            if self.rf_native is None:
+                self.rf_session = self._load_rf_session(sup_dir)
+            
+            # train_supervised.py saves only the Booster; older model dirs
+            # ship a pickled XGBClassifier instead
+            self.xgb_booster = self._load_xgb_booster(sup_dir)
+            self.xgb_model = None
+            if self.xgb_booster is None:
+                self.xgb_model = joblib.load(sup_dir / 'xgboost.pkl')
+                self.xgb_model.set_params(nthread=1, verbosity=0)  # Single-threaded
             
             self.supervised_scaler = joblib.load(sup_dir / 'scaler_supervised.pkl')
-            self.label_names = joblib.load(sup_dir / 'label_names.pkl')
+            self.scaler_mean, self.scaler_inv_scale = self._load_scaler_params(sup_dir)
+            self.xgb_bin_edges = (
+                self.supervised_scaler.get('xgb_bin_edges')
+                if isinstance(self.supervised_scaler, dict) else None
+            )
+            with open(sup_dir / 'label_names.json', 'r') as f:
+                self.label_names = {int(k): v for k, v in json.load(f).items()}
             
             self.models_loaded = True
             print("✅ [ENSEMBLE] All models loaded successfully!")
             print("   - Unsupervised: Isolation Forest (optimized)")
             print("   - Supervised: Random Forest + XGBoost (optimized)")
             print("   - Performance mode: Single-threaded inference")
+            if self.rf_native is not None:
+                print("   - Random Forest backend: native library (TL2cgen)")
+            elif self.rf_session is not None:
+                print("   - Random Forest backend: ONNX Runtime")
+            if self.xgb_booster is not None:
+                print("   - XGBoost backend: native Booster (inplace_predict)")
             
         except FileNotFoundError as e:
             print(f"⚠️  [ENSEMBLE] Model not found: {e}")
         except Exception as e:
             print(f"❌ [ENSEMBLE] Error loading models: {e}")
     
-    def load_mitre(self):
-        """Load MITRE ATT&CK mapper"""
+    def _load_rf_native(self, sup_dir):
+        """TL2cgen predictor for the compiled Random Forest, if built"""
+        lib_path = sup_dir / 'random_forest.so'
+        if not TL2CGEN_AVAILABLE or not lib_path.exists():
+            return None
+        
+        try:
+            return tl2cgen.Predictor(str(lib_path), nthread=1)
+        except Exception as e:
+            print(f"⚠️  [ENSEMBLE] Native Random Forest unavailable: {e}")
+            return None
+    
+    def _load_rf_session(self, sup_dir):
+        """ONNX Runtime session for the Random Forest, if exported"""
+        onnx_path = sup_dir / 'random_forest.onnx'
+        if not ONNX_AVAILABLE or not onnx_path.exists():
+            return None
+        
+        try:
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = 1  # Single-threaded, like sklearn above
+            session = ort.InferenceSession(
+                str(onnx_path), options, providers=['CPUExecutionProvider']
+            )
+            # Outputs are (label, probabilities); exported without ZipMap
+            self._rf_onnx_input = session.get_inputs()[0].name
+            self._rf_onnx_proba = session.get_outputs()[1].name
+            return session
+        except Exception as e:
+            print(f"⚠️  [ENSEMBLE] ONNX Random Forest unavailable: {e}")
+            return None
+    
+    def _load_xgb_booster(self, sup_dir):
+        """Native XGBoost booster (UBJSON, or JSON from older runs)"""
+        booster_path = sup_dir / 'xgboost.ubj'
+        if not booster_path.exists():
+            booster_path = sup_dir / 'xgboost.json'
+        if not booster_path.exists():
+            return None
+        
         try:
-            self.mitre_mapper = MITREMapper()
-            self.mitre_enabled = True
+            booster = xgb.Booster(model_file=str(booster_path))
+            booster.set_param({'nthread': 1})
+            return booster
         except Exception as e:
-            print(f"⚠️  [MITRE] Could not initialize: {e}")
-            self.mitre_enabled = False
+            print(f"⚠️  [ENSEMBLE] Native XGBoost booster unavailable: {e}")
+            return None
+    
+    def _rf_proba(self, features_scaled):
+        """Random Forest class probabilities; callers take the argmax instead of calling predict()"""
+        if self.rf_native is not None:
+            # Output is (rows, targets, classes) with a single target
+            proba = self.rf_native.predict(tl2cgen.DMatrix(features_scaled))
+            return proba.reshape(len(features_scaled), -1)
+        if self.rf_session is not None:
+            return self.rf_session.run(
+                [self._rf_onnx_proba], {self._rf_onnx_input: features_scaled}
+            )[0]
+        return self.rf_model.predict_proba(features_scaled)
+    
+    def _xgb_proba(self, features_scaled):
+        """XGBoost class probabilities"""
+        if self.xgb_bin_edges is not None:
+            # XGBoost was trained on uint8 quantile bins
+            features_scaled = bin_features(features_scaled, self.xgb_bin_edges)
+        if self.xgb_booster is not None:
+            return self.xgb_booster.inplace_predict(features_scaled)
+        return self.xgb_model.predict_proba(features_scaled)
+    
+    def _load_scaler_params(self, sup_dir):
+        """Supervised scaler mean and reciprocal scale as float32 vectors"""
+        mean_path = sup_dir / 'scaler_mean.npy'
+        inv_scale_path = sup_dir / 'scaler_invscale.npy'
+        if mean_path.exists() and inv_scale_path.exists():
+            mean, inv_scale = np.load(mean_path), np.load(inv_scale_path)
+        elif isinstance(self.supervised_scaler, dict):
+            # Persisted {mean, std, dtype} from train_supervised.py
+            mean = self.supervised_scaler['mean']
+            inv_scale = 1.0 / self.supervised_scaler['std']
+        else:
+            # Older model dirs only ship the pickled StandardScaler
+            mean = self.supervised_scaler.mean_
+            inv_scale = 1.0 / self.supervised_scaler.scale_
+        return mean.astype(np.float32), inv_scale.astype(np.float32)
+    
+    def load_mitre(self):
+        """Register MITRE ATT&CK mapper (loaded on first attack)"""
+        self._mitre_loader = MITREMapper
+        self.mitre_enabled = True
+    
+    @property
+    def mitre_mapper(self):
+        """MITRE mapper, initialized on first access"""
+        if self._mitre_mapper is None and self.mitre_enabled:
+            with self._lazy_lock:
+                if self._mitre_mapper is None and self.mitre_enabled:
+                    try:
+                        self._mitre_mapper = self._mitre_loader()
+                    except Exception as e:
+                        print(f"⚠️  [MITRE] Could not initialize: {e}")
+                        self.mitre_enabled = False
+        return self._mitre_mapper
     
     def load_lstm(self):
-        """Load LSTM sequence analyzer (optional for performance)"""
+        """Register LSTM sequence analyzer (loaded on first attack)"""
         if not LSTM_AVAILABLE:
             print("   ⚠️  LSTM: Module not available")
             self.lstm_enabled = False
             return
-            
-        try:
-            self.lstm_analyzer = get_lstm_analyzer(
-                sequence_length=10,
-                time_window=3600
-            )
-            self.lstm_enabled = True
-            print("   ✅ LSTM: Sequence analyzer initialized")
-        except Exception as e:
-            print(f"   ⚠️  LSTM: Could not initialize: {e}")
-            self.lstm_enabled = False
+        
+        self._lstm_loader = lambda: get_lstm_analyzer(
+            sequence_length=10,
+            time_window=3600
+        )
+        self.lstm_enabled = True
+    
+    @property
+    def lstm_analyzer(self):
+        """LSTM sequence analyzer, initialized on first access"""
+        if self._lstm_analyzer is None and self.lstm_enabled:
+            with self._lazy_lock:
+                if self._lstm_analyzer is None and self.lstm_enabled:
+                    try:
+                        self._lstm_analyzer = self._lstm_loader()
+                        print("   ✅ LSTM: Sequence analyzer initialized")
+                    except Exception as e:
+                        print(f"   ⚠️  LSTM: Could not initialize: {e}")
+                        self.lstm_enabled = False
+        return self._lstm_analyzer
+    
+    @property
+    def lstm_loaded(self):
+        """True once the analyzer exists (reporting must not force a load)"""
+        return self._lstm_analyzer is not None
     
     def extract_features_basic(self, log_data):
         """Extract 4 basic features for unsupervised model"""
+        features = np.empty(N_BASIC_FEATURES)
+        self._fill_features_basic(log_data, features)
+        return features
+    
+    def _fill_features_basic(self, log_data, out):
+        """Write the 4 basic features of one log into `out` (positional)"""
         port = int(log_data.get('destination_port', 0))
         
         service = log_data.get('service', '').upper()
@@ -193,20 +398,34 @@ class PALADINEnsemble:
         
         num_attempts = 3 if failed_login else 1
         
-        return np.array([port, is_ssh, failed_login, num_attempts])
+        out[0] = port
+        out[1] = is_ssh
+        out[2] = failed_login
+        out[3] = num_attempts
     
     def extract_features_advanced(self, log_data):
         """
         OPTIMIZED: Removed all random number generation
         Uses deterministic fallback values
         """
+        features = np.empty(N_ADVANCED_FEATURES)
+        self._fill_features_advanced(log_data, features)
+        return features
+    
+    def _fill_features_advanced(self, log_data, out):
+        """
+        Write the 12 advanced features of one log into `out`
+        
+        Specialized to the fixed feature schema: every feature is written
+        to its slot directly, so batch extraction fills a preallocated
+        matrix row without building intermediate lists
+        """
         # 1. Real data
         port = int(log_data.get('destination_port', 0))
         
         # FIXED: Add protocol encoding
-        protocol_map = {'tcp': 6, 'udp': 17, 'icmp': 1}
         protocol = log_data.get('protocol', 'tcp').lower()
-        protocol_num = protocol_map.get(protocol, 6)
+        protocol_num = PROTOCOL_MAP.get(protocol, 6)
         
         # Duration - use from log or default
         duration = float(log_data.get('duration', 1.0))
@@ -232,25 +451,24 @@ class PALADINEnsemble:
             flow_iat_mean = 0.05  # Fast attack
         else:
             flow_iat_mean = 10.0  # Normal traffic
-            
-        fwd_iat_mean = flow_iat_mean * 1.1
-        
-        # 4. Flags - defaults
-        syn_flag_count = 0
-        ack_flag_count = 1
         
+        # 4. Flags - defaults (syn=0, ack=1)
         # 5. Packet sizes
         average_packet_size = total_bytes / max(total_fwd_packets + total_backward_packets, 1)
-        avg_fwd_segment_size = average_packet_size
-        
-        # Return exactly 12 features (with protocol)
-        features = [
-            port, protocol_num, duration, total_fwd_packets, total_backward_packets,
-            flow_bytes_s, flow_packets_s, flow_iat_mean, fwd_iat_mean,
-            syn_flag_count, ack_flag_count, average_packet_size
-        ]
         
-        return np.array(features)
+        # Exactly 12 features (with protocol)
+        out[0] = port
+        out[1] = protocol_num
+        out[2] = duration
+        out[3] = total_fwd_packets
+        out[4] = total_backward_packets
+        out[5] = flow_bytes_s
+        out[6] = flow_packets_s
+        out[7] = flow_iat_mean
+        out[8] = flow_iat_mean * 1.1  # fwd_iat_mean
+        out[9] = 0                    # syn_flag_count
+        out[10] = 1                   # ack_flag_count
+        out[11] = average_packet_size
     
     def predict_unsupervised(self, log_data):
         """Unsupervised anomaly detection"""
@@ -278,22 +496,13 @@ class PALADINEnsemble:
         
         try:
             features = self.extract_features_advanced(log_data)
-            features_scaled = self.supervised_scaler.transform([features])
+            ensemble_proba = self._supervised_proba([features])[0]
             
-            # Get predictions
-            rf_pred = self.rf_model.predict(features_scaled)[0]
-            rf_proba = self.rf_model.predict_proba(features_scaled)[0]
-            
-            xgb_pred = self.xgb_model.predict(features_scaled)[0]
-            xgb_proba = self.xgb_model.predict_proba(features_scaled)[0]
-
-            # SIMPLIFIED: Fixed weighting (faster than dynamic)
-            # Dynamic weighting added minimal accuracy but lots of overhead
-            w_xgb, w_rf = 0.6, 0.4  # Fixed weights
-            
-            ensemble_proba = (w_rf * rf_proba) + (w_xgb * xgb_proba)
-            final_pred = np.argmax(ensemble_proba)
-            confidence = float(ensemble_proba[final_pred])
+            # Single row with a handful of classes: a plain Python argmax
+            # beats NumPy's per-call dispatch overhead
+            ensemble_proba = ensemble_proba.tolist()
+            confidence = max(ensemble_proba)
+            final_pred = ensemble_proba.index(confidence)
             
             attack_type = self.label_names.get(final_pred, 'UNKNOWN')
             
@@ -303,6 +512,23 @@ class PALADINEnsemble:
             print(f"[!] Supervised prediction error: {e}")
             return None, None
     
+    def _supervised_proba(self, features):
+        """Weighted RF + XGBoost class probabilities for a feature matrix"""
+        features = np.asarray(features)
+        # Trees work on C-contiguous float32; scaling writes straight into
+        # such a buffer so no model has to copy the input in check_array
+        features_scaled = np.empty(features.shape, dtype=np.float32)
+        _scale_rows(features, self.scaler_mean, self.scaler_inv_scale, features_scaled)
+        
+        rf_proba = self._rf_proba(features_scaled)
+        xgb_proba = self._xgb_proba(features_scaled)
+        
+        # SIMPLIFIED: Fixed weighting (faster than dynamic)
+        # Dynamic weighting added minimal accuracy but lots of overhead
+        w_xgb, w_rf = 0.6, 0.4  # Fixed weights
+        
+        return (w_rf * rf_proba) + (w_xgb * xgb_proba)
+    
     def predict(self, log_data, skip_lstm=True):
         """
         Full prediction with optional LSTM
@@ -315,6 +541,131 @@ class PALADINEnsemble:
         is_anomaly_unsup, anomaly_score = self.predict_unsupervised(log_data)
         attack_type, confidence = self.predict_supervised(log_data)
         
+        return self._enrich(
+            log_data, is_anomaly_unsup, anomaly_score,
+            attack_type, confidence, skip_lstm
+        )
+    
+    def predict_batch(self, logs, skip_lstm=True):
+        """
+        Batch prediction: one model call per batch instead of per log
+        
+        Features for all logs are written into preallocated matrices, then
+        each model runs once over the whole batch. Logs whose features
+        cannot be extracted fall back to the single-log path.
+        
+        Args:
+            logs: List of log entries to analyze
+            skip_lstm: Set to True for faster inference (default)
+        """
+        n = len(logs)
+        if n == 0:
+            return []
+        
+        basic = np.empty((n, N_BASIC_FEATURES))
+        advanced = np.empty((n, N_ADVANCED_FEATURES))
+        valid = np.ones(n, dtype=bool)
+        
+        for i, log_data in enumerate(logs):
+            try:
+                self._fill_features_basic(log_data, basic[i])
+                self._fill_features_advanced(log_data, advanced[i])
+            except (TypeError, ValueError, AttributeError):
+                valid[i] = False
+        
+        if not valid.all():
+            basic = basic[valid]
+            advanced = advanced[valid]
+        
+        # Unsupervised (batch)
+        anomalies = scores = None
+        if hasattr(self, 'unsupervised_model') and len(basic):
+            try:
+                basic_scaled = self.unsupervised_scaler.transform(basic)
+                scores = self.unsupervised_model.decision_function(basic_scaled)
+                anomalies = self.unsupervised_model.predict(basic_scaled) == -1
+            except Exception as e:
+                print(f"[!] Unsupervised prediction error: {e}")
+                anomalies = scores = None
+        
+        # Supervised (batch) - NumPy argmax pays off at this size
+        final_preds = confidences = None
+        if hasattr(self, 'rf_model') and len(advanced):
+            try:
+                ensemble_proba = self._supervised_proba(advanced)
+                final_preds = np.argmax(ensemble_proba, axis=1)
+                confidences = ensemble_proba[np.arange(len(final_preds)), final_preds]
+            except Exception as e:
+                print(f"[!] Supervised prediction error: {e}")
+                final_preds = confidences = None
+        
+        results = []
+        row = 0
+        for i, log_data in enumerate(logs):
+            if not valid[i]:
+                results.append(self.predict(log_data, skip_lstm=skip_lstm))
+                continue
+            
+            is_anomaly_unsup = anomaly_score = None
+            if anomalies is not None:
+                is_anomaly_unsup = bool(anomalies[row])
+                anomaly_score = float(scores[row])
+            
+            attack_type = confidence = None
+            if final_preds is not None:
+                attack_type = self.label_names.get(int(final_preds[row]), 'UNKNOWN')
+                confidence = float(confidences[row])
+            
+            row += 1
+            results.append(self._enrich(
+                log_data, is_anomaly_unsup, anomaly_score,
+                attack_type, confidence, skip_lstm
+            ))
+        
+        return results
+    
+    def predict_batch_parallel(self, logs, n_jobs=None, skip_lstm=True):
+        """
+        Batch prediction split across threads
+        
+        Uses joblib's threading backend: tree traversal and scaling run in
+        C and release the GIL, so chunks overlap without pickling logs to
+        worker processes. Small batches stay on a single thread.
+        
+        The LSTM analyzer keeps per-IP state, so sequence analysis runs
+        after the join, on this thread and in log order.
+        
+        Args:
+            logs: List of log entries to analyze
+            n_jobs: Number of threads (auto when None)
+            skip_lstm: Set to True for faster inference (default)
+        """
+        if n_jobs is None:
+            n_jobs = 1 if len(logs) < PARALLEL_MIN_BATCH else min(4, os.cpu_count() or 1)
+        
+        if n_jobs <= 1:
+            return self.predict_batch(logs, skip_lstm=skip_lstm)
+        
+        chunk_size = -(-len(logs) // n_jobs)
+        chunks = [logs[i:i + chunk_size] for i in range(0, len(logs), chunk_size)]
+        
+        results = Parallel(n_jobs=n_jobs, backend='threading')(
+            delayed(self._predict_chunk)(chunk) for chunk in chunks
+        )
+        results = list(chain.from_iterable(results))
+        
+        if not skip_lstm:
+            for log_data in results:
+                self._analyze_sequence(log_data, log_data['ai_attack_type'])
+        return results
+    
+    def _predict_chunk(self, chunk):
+        """Worker for predict_batch_parallel (models only, no LSTM)"""
+        return self.predict_batch(chunk, skip_lstm=True)
+    
+    def _enrich(self, log_data, is_anomaly_unsup, anomaly_score,
+                attack_type, confidence, skip_lstm):
+        """Combine model outputs into the final verdict and enrich the log"""
         # Determine final classification
         if attack_type and attack_type != 'NORMAL':
             final_status = "🚨 ATTACK"
@@ -331,23 +682,12 @@ class PALADINEnsemble:
         
         # === MITRE ATT&CK MAPPING ===
         mitre_mapping = None
-        if self.mitre_enabled and final_type != 'NORMAL':
+        if self.mitre_enabled and final_type != 'NORMAL' and self.mitre_mapper:
             try:
                 mitre_mapping = self.mitre_mapper.map_attack(final_type, final_confidence)
             except Exception as e:
                 print(f"[!] MITRE mapping error: {e}")
         
-        # === LSTM SEQUENCE ANALYSIS (Optional) ===
-        lstm_analysis = None
-        if not skip_lstm and self.lstm_enabled and final_type != 'NORMAL':
-            try:
-                timestamp = log_data.get('timestamp', datetime.now().isoformat())
-                lstm_analysis = self.lstm_analyzer.process_attack(
-                    log_data, final_type, timestamp
-                )
-            except Exception as e:
-                print(f"[!] LSTM analysis error: {e}")
-        
         # Enrich log
         log_data['ai_final_status'] = final_status
         log_data['ai_attack_type'] = final_type
@@ -366,10 +706,94 @@ class PALADINEnsemble:
         if mitre_mapping:
             log_data['mitre'] = mitre_mapping
         
+        if not skip_lstm:
+            self._analyze_sequence(log_data, final_type)
+        
+        return log_data
+    
+    def _analyze_sequence(self, log_data, final_type):
+        """LSTM sequence analysis (optional); adds log_data['lstm']"""
+        if not self.lstm_enabled or final_type == 'NORMAL' or not self.lstm_analyzer:
+            return
+        
+        try:
+            # Epoch seconds when absent; no need to format a string
+            timestamp = log_data.get('timestamp') or time.time()
+            lstm_analysis = self.lstm_analyzer.process_attack(
+                log_data, final_type, timestamp
+            )
+        except Exception as e:
+            print(f"[!] LSTM analysis error: {e}")
+            return
+        
         if lstm_analysis:
             log_data['lstm'] = lstm_analysis
+
+
+class BatchPredictor:
+    """
+    Micro-batching front end for the supervised ensemble
+    
+    Model calls cost roughly the same for 1 row as for dozens, so single
+    feature rows are queued into a preallocated buffer and classified
+    together once `batch_size` rows are waiting or the oldest queued row
+    is older than `flush_ms`. Each row's callback receives
+    (attack_type, confidence).
+    
+    There is no background timer: the `flush_ms` deadline is only checked
+    in submit() and poll(). Callers must call poll() from their loop while
+    idle, and flush() before shutdown, or a trailing partial batch never
+    reaches its callbacks. Not thread-safe.
+    """
+    
+    def __init__(self, ensemble, batch_size=MICRO_BATCH_SIZE, flush_ms=MICRO_BATCH_FLUSH_MS):
+        self.ensemble = ensemble
+        self.batch_size = batch_size
+        self.flush_interval = flush_ms / 1000.0
+        
+        self._buf = np.empty((batch_size, N_ADVANCED_FEATURES))
+        self._callbacks = [None] * batch_size
+        self._idx = 0
+        self._first_queued = 0.0
+    
+    def submit(self, row, callback):
+        """Queue one advanced-feature row (see extract_features_advanced)"""
+        if self._idx == 0:
+            self._first_queued = time.perf_counter()
         
-        return log_data
+        self._buf[self._idx] = row
+        self._callbacks[self._idx] = callback
+        self._idx += 1
+        
+        if self._idx == self.batch_size:
+            self.flush()
+        else:
+            self.poll()
+    
+    def poll(self):
+        """Flush if the oldest queued row has waited longer than flush_ms"""
+        if self._idx and time.perf_counter() - self._first_queued >= self.flush_interval:
+            self.flush()
+    
+    def flush(self):
+        """Classify all queued rows with one model call"""
+        n = self._idx
+        if n == 0:
+            return
+        
+        # Take the batch before the model call: if it raises, these rows
+        # are dropped but the buffer is free for the next submit()
+        callbacks = self._callbacks[:n]
+        self._callbacks[:n] = [None] * n
+        self._idx = 0
+        
+        ensemble_proba = self.ensemble._supervised_proba(self._buf[:n])
+        final_preds = np.argmax(ensemble_proba, axis=1)
+        confidences = ensemble_proba[np.arange(n), final_preds]
+        
+        label_names = self.ensemble.label_names
+        for callback, pred, confidence in zip(callbacks, final_preds, confidences):
+            callback(label_names.get(int(pred), 'UNKNOWN'), float(confidence))
 
 
 # Global instance
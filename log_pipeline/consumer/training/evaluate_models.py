@@ -5,11 +5,13 @@ File: log_pipeline/consumer/training/evaluate_models.py
 Detailed evaluation of trained models
 """
 
-import pandas as pd
+import polars as pl
 import numpy as np
 import joblib
+import xgboost as xgb
 import json
 from pathlib import Path
+from feature_bins import bin_features
 from sklearn.metrics import (
     classification_report, confusion_matrix, 
     accuracy_score, precision_recall_fscore_support
@@ -28,9 +30,9 @@ MODEL_DIR = BASE_DIR / 'models/supervised'
 
 # Load test data
 print("\n📥 Loading test data...")
-test_df = pd.read_csv(DATA_DIR / 'test_balanced.csv')
-X_test = test_df.drop('label', axis=1).values
-y_test = test_df['label'].values
+test_df = pl.read_parquet(DATA_DIR / 'test_balanced.parquet')
+X_test = test_df.drop('label').to_numpy()
+y_test = test_df['label'].to_numpy()
 
 with open(DATA_DIR / 'label_mapping.json', 'r') as f:
     label_mapping = json.load(f)
@@ -41,10 +43,29 @@ print(f"✅ Test set: {len(X_test):,} samples")
 # Load models
 print("\n📦 Loading models...")
 rf_model = joblib.load(MODEL_DIR / 'random_forest.pkl')
-xgb_model = joblib.load(MODEL_DIR / 'xgboost.pkl')
+# Same fallback order as the ensemble: UBJSON, JSON, then a pickled XGBClassifier
+xgb_booster = None
+for booster_name in ('xgboost.ubj', 'xgboost.json'):
+    if (MODEL_DIR / booster_name).exists():
+        xgb_booster = xgb.Booster(model_file=str(MODEL_DIR / booster_name))
+        break
+if xgb_booster is None:
+    xgb_model = joblib.load(MODEL_DIR / 'xgboost.pkl')
 scaler = joblib.load(MODEL_DIR / 'scaler_supervised.pkl')
 
-X_test_scaled = scaler.transform(X_test)
+# Persisted as {mean, std, dtype}; older runs stored a StandardScaler
+if isinstance(scaler, dict):
+    X_test_scaled = np.ascontiguousarray(X_test, dtype=np.float32)
+    np.subtract(X_test_scaled, scaler['mean'], out=X_test_scaled)
+    np.divide(X_test_scaled, scaler['std'], out=X_test_scaled)
+else:
+    X_test_scaled = scaler.transform(X_test)
+
+# XGBoost input: uint8 quantile bins when the model was trained on them
+if isinstance(scaler, dict) and 'xgb_bin_edges' in scaler:
+    X_test_xgb = bin_features(X_test_scaled, scaler['xgb_bin_edges'])
+else:
+    X_test_xgb = X_test_scaled
 
 # ============================================================================
 # RANDOM FOREST EVALUATION
@@ -54,7 +75,10 @@ print("\n" + "="*70)
 print("🌲 RANDOM FOREST EVALUATION")
 print("="*70)
 
-rf_pred = rf_model.predict(X_test_scaled)
+# One forest traversal: predict() is argmax(predict_proba()), so derive the
+# class from the probabilities that the ensemble reuses below
+rf_proba = rf_model.predict_proba(X_test_scaled)
+rf_pred = rf_proba.argmax(axis=1)
 rf_acc = accuracy_score(y_test, rf_pred)
 
 print(f"\n✅ Accuracy: {rf_acc*100:.2f}%")
@@ -93,7 +117,11 @@ print("\n" + "="*70)
 print("🚀 XGBOOST EVALUATION")
 print("="*70)
 
-xgb_pred = xgb_model.predict(X_test_scaled)
+if xgb_booster is not None:
+    xgb_proba = xgb_booster.inplace_predict(X_test_xgb)
+else:
+    xgb_proba = xgb_model.predict_proba(X_test_xgb)
+xgb_pred = xgb_proba.argmax(axis=1)
 xgb_acc = accuracy_score(y_test, xgb_pred)
 
 print(f"\n✅ Accuracy: {xgb_acc*100:.2f}%")
@@ -119,9 +147,6 @@ print("\n" + "="*70)
 print("🎯 ENSEMBLE EVALUATION (RF 40% + XGB 60%)")
 print("="*70)
 
-rf_proba = rf_model.predict_proba(X_test_scaled)
-xgb_proba = xgb_model.predict_proba(X_test_scaled)
-
 # Weighted ensemble
 ensemble_proba = 0.4 * rf_proba + 0.6 * xgb_proba
 ensemble_pred = np.argmax(ensemble_proba, axis=1)
@@ -165,15 +190,15 @@ print(f"\n🔍 Total Errors: {error_count:,} / {len(y_test):,} ({error_count/len
 
 if error_count > 0:
     print("\n📊 Most Common Misclassifications:")
-    error_pairs = []
-    for i in range(len(y_test)):
-        if errors[i]:
-            error_pairs.append((label_mapping[y_test[i]], label_mapping[ensemble_pred[i]]))
-    
-    from collections import Counter
-    common_errors = Counter(error_pairs).most_common(10)
-    for (true, pred), count in common_errors:
-        print(f"   {true:15s} → {pred:15s}: {count:>4,} times")
+    # Encode each (true, pred) pair as a single id and count them in one pass
+    K = len(label_mapping)
+    pair_id = y_test.astype(np.int64) * K + ensemble_pred.astype(np.int64)
+    counts = np.bincount(pair_id[errors], minlength=K * K)
+    top = np.argsort(counts)[-10:][::-1]
+    top = top[counts[top] > 0]
+    for t, p in zip(*divmod(top, K)):
+        true, pred = label_mapping[int(t)], label_mapping[int(p)]
+        print(f"   {true:15s} → {pred:15s}: {counts[t * K + p]:>4,} times")
 
 # ============================================================================
 # SUMMARY
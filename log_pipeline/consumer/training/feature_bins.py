@@ -0,0 +1,31 @@
+"""
+PALADIN - XGBoost Feature Binning
+File: log_pipeline/consumer/training/feature_bins.py
+
+uint8 quantile bins shared by training, evaluation and the ensemble
+(NumPy only, so importing it does not pull in the inference stack)
+"""
+
+import numpy as np
+
+# XGBoost trains on uint8 bins: 256 bins, 255 cut points per feature
+XGB_N_BINS = 256
+
+
+def quantile_bin_edges(X, n_bins=XGB_N_BINS):
+    """Per-feature quantile cut points, shape (n_features, n_bins - 1)"""
+    quantiles = np.linspace(0, 1, n_bins + 1)[1:-1]
+    return np.ascontiguousarray(np.quantile(X, quantiles, axis=0).T, dtype=np.float32)
+
+
+def bin_features(X, edges, out=None):
+    """
+    Map each column of X to its uint8 quantile bin, as seen by XGBoost
+
+    edges: (n_features, XGB_N_BINS - 1) float32 cut points from quantile_bin_edges
+    """
+    if out is None:
+        out = np.empty(X.shape, dtype=np.uint8)
+    for j in range(X.shape[1]):
+        out[:, j] = np.searchsorted(edges[j], X[:, j], side='right')
+    return out
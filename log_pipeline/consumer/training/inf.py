@@ -8,13 +8,13 @@ Measures the inference time of the ensemble predictor
 import sys
 import time
 import numpy as np
-import pandas as pd
+import polars as pl
 from pathlib import Path
 
 # Add parent directory to path
 sys.path.insert(0, str(Path('/app/log_pipeline/consumer/training')))
 
-from ensemble_predictor import get_ensemble
+from ensemble_predictor import get_ensemble, BatchPredictor
 
 print("="*70)
 print("⏱️  PALADIN INFERENCE TIME MEASUREMENT")
@@ -22,8 +22,8 @@ print("="*70)
 
 # Load test data
 print("\n📥 Loading test data...")
-test_df = pd.read_csv('/app/data/cic_ids_2017/processed/test_balanced.csv')
-X_test = test_df.drop('label', axis=1)
+test_df = pl.read_parquet('/app/data/cic_ids_2017/processed/test_balanced.parquet')
+X_test = test_df.drop('label')
 
 print(f"✅ Loaded {len(X_test):,} test samples")
 
@@ -40,7 +40,7 @@ print("🔬 SINGLE PREDICTION TIMING")
 print("="*70)
 
 # Prepare a single sample as a log_data dict
-sample_features = X_test.iloc[0].to_dict()
+sample_features = X_test.row(0, named=True)
 
 # Create a realistic log_data dict
 log_data = {
@@ -100,8 +100,7 @@ for batch_size in batch_sizes:
     
     # Create batch of log_data dicts
     batch_logs = []
-    for idx in range(batch_size):
-        sample = X_test.iloc[idx].to_dict()
+    for idx, sample in enumerate(X_test.head(batch_size).iter_rows(named=True)):
         log = {
             'destination_port': int(sample.get('destination_port', 80)),
             'protocol': 'tcp',
@@ -128,6 +127,33 @@ for batch_size in batch_sizes:
     print(f"   Avg per sample:  {avg_per_sample:>10.2f} μs")
     print(f"   Throughput:      {throughput:>10.2f} predictions/sec")
 
+# ============================================================================
+# MICRO-BATCHED SUPERVISED TIMING
+# ============================================================================
+
+print("\n" + "="*70)
+print("🧺 MICRO-BATCHED SUPERVISED TIMING")
+print("="*70)
+
+# Reuse the largest batch built above as a stream of single feature rows
+feature_rows = [ensemble.extract_features_advanced(log) for log in batch_logs]
+
+print(f"\n📊 Streaming {len(feature_rows):,} rows through BatchPredictor...")
+print(f"\n   {'Batch':>6s} {'Per row (μs)':>14s} {'Throughput (/s)':>16s}")
+
+for micro_batch in [1, 8, 16, 32, 64]:
+    batcher = BatchPredictor(ensemble, batch_size=micro_batch)
+    done = lambda attack_type, confidence: None
+    
+    start = time.perf_counter()
+    for row in feature_rows:
+        batcher.submit(row, done)
+    batcher.flush()
+    elapsed = time.perf_counter() - start
+    
+    per_row_us = elapsed / len(feature_rows) * 1e6
+    print(f"   {micro_batch:>6d} {per_row_us:>14.2f} {len(feature_rows)/elapsed:>16.0f}")
+
 # ============================================================================
 # COMPONENT-LEVEL TIMING
 # ============================================================================
@@ -258,9 +284,45 @@ print("\n" + "="*70)
 print("🚀 REAL-TIME PERFORMANCE ESTIMATE")
 print("="*70)
 
-predictions_per_sec = 1e6 / mean_time  # 1 million μs per second
+single_row_per_sec = 1e6 / mean_time  # 1 million μs per second
+
+# Per-call overhead dominates single-row timing, so sweep batch sizes
+# through predict_batch and report the best amortized per-row cost
+sweep_sizes = [b for b in [1, 8, 64, 256, 1024] if b <= len(X_test)]
+sweep_logs = [
+    {
+        'destination_port': int(sample.get('destination_port', 80)),
+        'protocol': 'tcp',
+        'duration': float(sample.get('flow_duration', 1.0)),
+        'packets': int(sample.get('total_fwd_packets', 10)),
+        'service': 'ssh',
+        'message': 'login attempt',
+        'src_ip': f'192.168.1.{idx % 255}',
+        'timestamp': '2024-12-06T10:00:00Z'
+    }
+    for idx, sample in enumerate(X_test.head(sweep_sizes[-1]).iter_rows(named=True))
+]
+
+print(f"\n📊 Batched throughput (predict_batch, 100 iterations each):")
+print(f"\n   {'Batch':>6s} {'Per call (μs)':>14s} {'Per row (μs)':>14s} {'Throughput (/s)':>16s}")
+
+per_row_ns = {}
+for B in sweep_sizes:
+    batch = sweep_logs[:B]
+    start = time.perf_counter_ns()
+    for _ in range(100):
+        _ = ensemble.predict_batch(batch)
+    per_call_ns = (time.perf_counter_ns() - start) / 100
+    per_row_ns[B] = per_call_ns / B
+    print(f"   {B:>6d} {per_call_ns/1000:>14.2f} {per_row_ns[B]/1000:>14.2f} {1e9/per_row_ns[B]:>16.0f}")
+
+best_batch = min(per_row_ns, key=per_row_ns.get)
+predictions_per_sec = 1e9 / per_row_ns[best_batch]
+
+print(f"\nSingle-row Throughput (predict):")
+print(f"   {single_row_per_sec:>10.0f} predictions/second")
 
-print(f"\nMaximum Throughput:")
+print(f"\nMaximum Throughput (batch of {best_batch}):")
 print(f"   {predictions_per_sec:>10.0f} predictions/second")
 print(f"   {predictions_per_sec*60:>10.0f} predictions/minute")
 print(f"   {predictions_per_sec*3600:>10.0f} predictions/hour")
@@ -286,7 +348,8 @@ print("="*70)
 
 print(f"\n📊 Key Metrics for Presentation:")
 print(f"   Average Inference Time:  {mean_time:>.2f} μs ({mean_time/1000:.3f} ms)")
-print(f"   Maximum Throughput:      {predictions_per_sec:>,.0f} predictions/sec")
+print(f"   Single-row Throughput:   {single_row_per_sec:>,.0f} predictions/sec")
+print(f"   Maximum Throughput:      {predictions_per_sec:>,.0f} predictions/sec (batch of {best_batch})")
 print(f"   Suitable for Real-time:  {'Yes ✅' if predictions_per_sec > 1000 else 'No ❌'}")
 
 print(f"\n💾 Save these numbers for your presentation!")
\ No newline at end of file
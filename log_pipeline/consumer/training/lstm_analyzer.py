@@ -5,15 +5,127 @@ Tracks attacker behavior over time and detects multi-stage attacks
 File: log_pipeline/consumer/training/lstm_analyzer.py
 """
 
+import atexit
 from pathlib import Path
 import numpy as np
 import pickle
-from collections import deque, defaultdict
-from datetime import datetime, timedelta, timezone
+import socket
+import struct
+import sys
+import threading
+import time
+from collections import deque, defaultdict, OrderedDict
+from datetime import datetime, timezone
 import logging
 
+# Optional Aho-Corasick matcher (falls back to substring search)
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+# Optional LMDB store for cold attack sequences evicted from memory
+try:
+    import lmdb
+    LMDB_AVAILABLE = True
+except ImportError:
+    LMDB_AVAILABLE = False
+
 logger = logging.getLogger(__name__)
 
+# Write-ahead log record: epoch seconds, attack code, port, then the
+# lengths of the source IP and service strings that follow the header
+WAL_RECORD = struct.Struct('<dBHBB')
+
+# Full pickle snapshot (and WAL truncation) every N logged attacks
+SNAPSHOT_EVERY = 10_000
+
+# Buffered WAL bytes reach the OS at least this often, so a killed
+# process loses at most about a second of events
+WAL_FLUSH_INTERVAL = 1.0
+
+# Sequences kept in memory; least recently active ones spill to LMDB,
+# SPILL_BATCH at a time so eviction is one write transaction per batch
+MAX_HOT_SEQUENCES = 50_000
+SPILL_BATCH = 1_000
+SPILL_MAP_SIZE = 1 << 30
+
+# Spill record: last_seen (epoch ns) followed by the pickled sequence
+SPILL_HEADER = struct.Struct('<q')
+
+
+NS_PER_SECOND = 1_000_000_000
+
+# Attack type -> integer code (WAL records, pattern matching)
+ATTACK_ENCODER = {
+    'NORMAL': 0,
+    'UNKNOWN_THREAT': 1,
+    'BRUTE_FORCE': 2,
+    'DOS': 3,
+    'DDOS': 4,
+    'PORT_SCAN': 5,
+    'WEB_ATTACK': 6,
+    'BOTNET': 7,
+    'INFILTRATION': 8,
+    'HEARTBLEED': 9
+}
+
+# Pattern flags driving recommendations (OR-ed over detected patterns)
+PATTERN_RECON = 1
+PATTERN_INFILTRATION = 2
+PATTERN_BOTNET = 4
+
+
+def _encode_codes(codes):
+    """Pack small integer attack codes into a string, one char per attack"""
+    return ''.join(map(chr, codes))
+
+
+def _parse_timestamp_ns(timestamp):
+    """
+    Convert a timestamp to int64 epoch nanoseconds (UTC)
+    
+    Accepts epoch seconds (int/float) or ISO-8601 strings. Naive and 'Z'
+    strings are parsed by NumPy's C parser; strings with an explicit
+    UTC offset go through datetime. Unparseable values map to now.
+    """
+    if isinstance(timestamp, (int, float)):
+        return int(timestamp * NS_PER_SECOND)
+    
+    try:
+        if timestamp.endswith('Z'):
+            timestamp = timestamp[:-1]
+        elif '+' in timestamp[10:] or '-' in timestamp[10:]:
+            return int(datetime.fromisoformat(timestamp).timestamp() * NS_PER_SECOND)
+        return int(np.datetime64(timestamp, 'ns').astype(np.int64))
+    except (TypeError, ValueError, AttributeError):
+        # Fallback for bad timestamps
+        return time.time_ns()
+
+
+def _ip_key(source_ip):
+    """
+    Dict key for a source IP: the 32-bit integer for IPv4 addresses,
+    the original string for anything else (IPv6, 'unknown', ...)
+    """
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, source_ip), 'big')
+    except (OSError, TypeError):
+        return source_ip
+
+
+def _spill_key(key):
+    """LMDB key for an _ip_key value"""
+    if isinstance(key, int):
+        return b'\x00' + key.to_bytes(4, 'big')
+    return str(key).encode()
+
+
+def _ns_to_iso(timestamp_ns):
+    """ISO-8601 (UTC) representation of epoch nanoseconds"""
+    return datetime.fromtimestamp(timestamp_ns / NS_PER_SECOND, timezone.utc).isoformat()
+
 
 class AttackSequence:
     """Represents a sequence of attacks from a single source"""
@@ -33,30 +145,68 @@ class AttackSequence:
         
         # Attack sequence data
         self.attacks = deque(maxlen=max_length)
-        self.timestamps = deque(maxlen=max_length)
+        self.encoded_attacks = deque(maxlen=max_length)
         self.services = deque(maxlen=max_length)
         self.ports = deque(maxlen=max_length)
         
-        # Sequence statistics
+        # Epoch-nanosecond ring buffer kept in step with the deques above:
+        # _head is the next slot to write, _count the number of live entries
+        self.timestamps = np.empty(max_length, dtype=np.int64)
+        self._head = 0
+        self._count = 0
+        
+        # Sequence statistics (epoch nanoseconds)
         self.first_seen = None
         self.last_seen = None
         self.total_attacks = 0
         self.attack_types_count = defaultdict(int)
         
-    def add_attack(self, attack_type, timestamp, service=None, port=None):
-        """Add attack to sequence"""
+        # get_statistics() cache, invalidated by bumping _version
+        self._version = 0
+        self._stats_cache = None
+        self._stats_cache_version = -1
         
-        # 1. Standardize Timezone (Force UTC)
-        if timestamp.endswith('Z'):
-             timestamp = timestamp.replace('Z', '+00:00')
+        # Number of the last WAL event applied to this sequence
+        self.wal_seq = 0
         
-        try:
-            current_time = datetime.fromisoformat(timestamp)
-            if current_time.tzinfo is None:
-                current_time = current_time.replace(tzinfo=timezone.utc)
-        except ValueError:
-            # Fallback for bad timestamps
-            current_time = datetime.now(timezone.utc)
+    def __setstate__(self, state):
+        """Unpickle, upgrading sequences snapshotted by the datetime-based format"""
+        self.__dict__.update(state)
+        self.__dict__.setdefault('wal_seq', 0)
+        if 'encoded_attacks' in state:
+            return
+        
+        # Legacy object: timestamps were a deque of aware datetimes and
+        # there was no ring buffer, attack codes or statistics cache
+        legacy_times = [int(t.timestamp() * NS_PER_SECOND) for t in state['timestamps']]
+        self.encoded_attacks = deque(
+            (ATTACK_ENCODER.get(a, ATTACK_ENCODER['UNKNOWN_THREAT']) for a in self.attacks),
+            maxlen=self.max_length
+        )
+        self.timestamps = np.empty(self.max_length, dtype=np.int64)
+        self._count = len(legacy_times)
+        self.timestamps[:self._count] = legacy_times
+        self._head = self._count % self.max_length
+        
+        for name in ('first_seen', 'last_seen'):
+            value = getattr(self, name)
+            if isinstance(value, datetime):
+                setattr(self, name, int(value.timestamp() * NS_PER_SECOND))
+        
+        self._version = 0
+        self._stats_cache = None
+        self._stats_cache_version = -1
+    
+    def add_attack(self, attack_type, timestamp, service=None, port=None, attack_code=0):
+        """
+        Add attack to sequence
+        
+        Args:
+            timestamp: ISO-8601 string or epoch seconds (int/float)
+            attack_code: Integer encoding of attack_type (see attack_encoder)
+        """
+        # 1. Normalize to UTC epoch nanoseconds
+        current_time = _parse_timestamp_ns(timestamp)
 
         # 2. Fix: Ensure first_seen is ALWAYS set
         if self.first_seen is None:
@@ -66,24 +216,36 @@ class AttackSequence:
         self.total_attacks += 1
         
         self.attacks.append(attack_type)
-        self.timestamps.append(current_time)
+        self.encoded_attacks.append(attack_code)
+        self.timestamps[self._head] = current_time
+        self._head = (self._head + 1) % self.max_length
+        self._count = min(self._count + 1, self.max_length)
         self.services.append(service)
         self.ports.append(port)
         self.attack_types_count[attack_type] += 1
         
         # Clean old attacks outside time window
         self._clean_old_attacks()
+        self._version += 1
+    
+    def get_timestamps(self):
+        """Live timestamps (epoch ns), oldest first"""
+        start = (self._head - self._count) % self.max_length
+        if start + self._count <= self.max_length:
+            return self.timestamps[start:start + self._count]
+        return np.concatenate((self.timestamps[start:], self.timestamps[:self._head]))
     
     def _clean_old_attacks(self):
         """Remove attacks outside time window"""
-        if not self.timestamps:
+        if not self._count:
             return
         
-        cutoff_time = self.last_seen - timedelta(seconds=self.time_window)
+        cutoff_time = self.last_seen - self.time_window * NS_PER_SECOND
         
-        while self.timestamps and self.timestamps[0] < cutoff_time:
-            self.timestamps.popleft()
+        while self._count and self.timestamps[(self._head - self._count) % self.max_length] < cutoff_time:
+            self._count -= 1
             self.attacks.popleft()
+            self.encoded_attacks.popleft()
             self.services.popleft()
             self.ports.popleft()
     
@@ -101,19 +263,22 @@ class AttackSequence:
         return sequence
     
     def get_time_deltas(self):
-        """Get time intervals between attacks (in seconds)"""
-        if len(self.timestamps) < 2:
-            return []
-        
-        deltas = []
-        for i in range(1, len(self.timestamps)):
-            delta = (self.timestamps[i] - self.timestamps[i-1]).total_seconds()
-            deltas.append(delta)
+        """Get time intervals between attacks (in seconds) as a float64 array"""
+        if self._count < 2:
+            return np.empty(0, dtype=np.float64)
         
-        return deltas
+        return np.diff(self.get_timestamps()) * (1.0 / NS_PER_SECOND)
     
     def get_statistics(self):
-        """Get sequence statistics with Safe Defaults"""
+        """
+        Get sequence statistics with Safe Defaults
+        
+        The dict is cached until the next add_attack; callers must copy
+        it before modifying
+        """
+        if self._stats_cache_version == self._version:
+            return self._stats_cache
+        
         # 1. Define safe defaults (Prevent KeyErrors)
         stats = {
             'source_ip': self.source_ip,
@@ -130,19 +295,23 @@ class AttackSequence:
 
         # 2. If data is invalid, return defaults immediately
         if not self.attacks or self.first_seen is None or self.last_seen is None:
+            self._stats_cache = stats
+            self._stats_cache_version = self._version
             return stats
             
         # 3. Calculate real stats if data is good
         try:
-            duration = (self.last_seen - self.first_seen).total_seconds()
+            duration = (self.last_seen - self.first_seen) / NS_PER_SECOND
             stats['duration_seconds'] = duration
             stats['attack_rate'] = len(self.attacks) / max(duration, 1.0)
-            stats['first_seen'] = self.first_seen.isoformat()
-            stats['last_seen'] = self.last_seen.isoformat()
+            stats['first_seen'] = _ns_to_iso(self.first_seen)
+            stats['last_seen'] = _ns_to_iso(self.last_seen)
         except Exception as e:
             # If math fails (e.g. timezone mismatch), just keep defaults
             print(f"[!] Stats calculation error: {e}")
-            
+        
+        self._stats_cache = stats
+        self._stats_cache_version = self._version
         return stats
 
 
@@ -162,53 +331,292 @@ class LSTMSequenceAnalyzer:
         self.sequence_length = sequence_length
         self.time_window = time_window
         
-        # Track sequences per source IP
-        self.active_sequences = {}
+        # Track sequences per source IP (keyed by _ip_key), least
+        # recently active first; overflow spills to LMDB
+        self.active_sequences = OrderedDict()
         
         # Attack type encoding
-        self.attack_encoder = {
-            'NORMAL': 0,
-            'UNKNOWN_THREAT': 1,
-            'BRUTE_FORCE': 2,
-            'DOS': 3,
-            'DDOS': 4,
-            'PORT_SCAN': 5,
-            'WEB_ATTACK': 6,
-            'BOTNET': 7,
-            'INFILTRATION': 8,
-            'HEARTBLEED': 9
-        }
+        self.attack_encoder = dict(ATTACK_ENCODER)
         
         # Known attack patterns (attack chains)
         self.attack_patterns = self._define_attack_patterns()
+        self._pattern_matcher = self._build_pattern_matcher()
+        
+        # Attack types that weigh on the behavioral threat score
+        self._critical_codes = np.array(
+            [self.attack_encoder[t] for t in ('INFILTRATION', 'BOTNET', 'DDOS', 'HEARTBLEED')],
+            dtype=np.uint8
+        )
         
         # Campaign tracking
         self.campaigns = defaultdict(list)
         
+        # Expired sequences are swept at most once per interval
+        self._last_cleanup_ns = 0
+        self._cleanup_interval_ns = 60 * NS_PER_SECOND
+        
         logger.info("LSTM Sequence Analyzer initialized")
         logger.info(f"  Sequence length: {sequence_length}")
         logger.info(f"  Time window: {time_window}s ({time_window/3600:.1f} hours)")
 
         self.state_file = Path('/app/data/lstm_state.pkl') # Persist here
+        self.wal_file = Path('/app/data/lstm_wal.bin')
+        self.spill_dir = Path('/app/data/lstm_spill')
+        self._events_since_snapshot = 0
+        # WAL events are numbered from the snapshot's event_seq onwards
+        self._event_seq = 0
+        # Spill keys whose LMDB copy stays until a snapshot covers it
+        self._stale_spill_keys = set()
+        self._wal = None
+        self._spill = self._open_spill()
         self._load_state()
+        self._wal = self._open_wal()
+        if self._wal is not None:
+            threading.Thread(target=self._wal_flusher, name='lstm-wal-flush', daemon=True).start()
+            atexit.register(self._flush_wal)
+    
+    def _open_spill(self):
+        """Open the LMDB environment holding cold sequences"""
+        if not LMDB_AVAILABLE:
+            return None
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            # Same durability as the WAL: survives a process crash via the
+            # page cache, fsynced at every snapshot (see _save_state)
+            return lmdb.open(
+                str(self.spill_dir), map_size=SPILL_MAP_SIZE,
+                sync=False, metasync=False
+            )
+        except Exception as e:
+            print(f"   [LSTM] Error opening spill store: {e}")
+            return None
+    
+    def _evict_cold_sequences(self):
+        """
+        Once past MAX_HOT_SEQUENCES, move the least recently active
+        sequences to LMDB until SPILL_BATCH slots are free again
+        """
+        if self._spill is None or len(self.active_sequences) <= MAX_HOT_SEQUENCES:
+            return
+        
+        # Spilled copies must never be ahead of the WAL they are replayed from
+        self._flush_wal()
+        # Never the caller's sequence, which is about to take an attack
+        target = max(MAX_HOT_SEQUENCES - SPILL_BATCH, 1)
+        try:
+            with self._spill.begin(write=True) as txn:
+                while len(self.active_sequences) > target:
+                    key, sequence = self.active_sequences.popitem(last=False)
+                    spill_key = _spill_key(key)
+                    txn.put(
+                        spill_key,
+                        SPILL_HEADER.pack(sequence.last_seen or 0)
+                        + pickle.dumps(sequence, pickle.HIGHEST_PROTOCOL)
+                    )
+                    self._stale_spill_keys.discard(spill_key)
+        except Exception as e:
+            print(f"   [LSTM] Error spilling sequences: {e}")
+    
+    def _rehydrate_sequence(self, key):
+        """
+        Load a spilled sequence back out of LMDB (None if absent)
+        
+        The record is the only durable copy until a snapshot includes the
+        sequence, so it is only marked stale here and deleted by _save_state
+        """
+        if self._spill is None:
+            return None
+        
+        spill_key = _spill_key(key)
+        try:
+            with self._spill.begin() as txn:
+                record = txn.get(spill_key)
+        except Exception as e:
+            print(f"   [LSTM] Error reading spill store: {e}")
+            return None
+        if record is None:
+            return None
+        
+        self._stale_spill_keys.add(spill_key)
+        return pickle.loads(record[SPILL_HEADER.size:])
+    
+    def _drop_stale_spilled(self):
+        """Delete spill records now covered by the snapshot"""
+        if self._spill is None:
+            return
+        
+        with self._spill.begin(write=True) as txn:
+            for spill_key in self._stale_spill_keys:
+                txn.delete(spill_key)
+        self._stale_spill_keys.clear()
+        self._spill.sync(True)
+    
+    def _spilled_count(self):
+        """Number of sequences spilled to LMDB and not back in memory"""
+        if self._spill is None:
+            return 0
+        return self._spill.stat()['entries'] - len(self._stale_spill_keys)
+    
+    def _open_wal(self):
+        """Open the write-ahead log for appending"""
+        try:
+            return open(self.wal_file, 'ab', buffering=1 << 16)
+        except Exception as e:
+            print(f"   [LSTM] Error opening WAL: {e}")
+            return None
+    
+    def _append_wal(self, sequence, attack_code, timestamp, service, port):
+        """Append one attack to the WAL; snapshot every SNAPSHOT_EVERY events"""
+        if self._wal is not None:
+            ip_bytes = str(sequence.source_ip).encode()[:255]
+            # None is stored as a zero-length field
+            service_bytes = b'' if service is None else str(service).encode()[:255]
+            try:
+                self._wal.write(
+                    WAL_RECORD.pack(timestamp, attack_code, port,
+                                    len(ip_bytes), len(service_bytes))
+                    + ip_bytes + service_bytes
+                )
+                # Only written records get a number, so replay counts the same
+                self._event_seq += 1
+                sequence.wal_seq = self._event_seq
+            except Exception as e:
+                print(f"Error writing WAL: {e}")
+        
+        self._events_since_snapshot += 1
+        if self._events_since_snapshot >= SNAPSHOT_EVERY:
+            self._save_state()
+    
+    def _flush_wal(self):
+        """Push buffered WAL records to the OS (also run at interpreter exit)"""
+        if self._wal is None:
+            return
+        try:
+            self._wal.flush()
+        except Exception as e:
+            print(f"Error flushing WAL: {e}")
+    
+    def _wal_flusher(self):
+        """Background loop: appends stay buffered, but never for long"""
+        while True:
+            time.sleep(WAL_FLUSH_INTERVAL)
+            self._flush_wal()
     
     def _save_state(self):
-        """Save active sequences to disk"""
+        """Snapshot active sequences to disk and truncate the WAL"""
         try:
-            with open(self.state_file, 'wb') as f:
-                pickle.dump(self.active_sequences, f)
+            tmp_file = self.state_file.with_suffix('.tmp')
+            with open(tmp_file, 'wb') as f:
+                pickle.dump({
+                    'version': 2,
+                    'event_seq': self._event_seq,
+                    'sequences': self.active_sequences,
+                }, f)
+            tmp_file.replace(self.state_file)
+            
+            # Spilled sequences persist through LMDB alone: sync it before
+            # dropping the WAL records that could rebuild them
+            self._drop_stale_spilled()
+            if self._wal is not None:
+                self._wal.flush()
+                self._wal.truncate(0)
+            self._events_since_snapshot = 0
         except Exception as e:
             print(f"Error saving state: {e}")
 
     def _load_state(self):
-        """Load sequences from disk"""
+        """Load the last snapshot, then replay the WAL on top of it"""
         if self.state_file.exists():
             try:
                 with open(self.state_file, 'rb') as f:
-                    self.active_sequences = pickle.load(f)
+                    state = pickle.load(f)
+                if 'version' in state:
+                    sequences = state['sequences']
+                    self._event_seq = state['event_seq']
+                else:
+                    sequences = state  # Bare mapping from before WAL numbering
+                # Re-key so snapshots taken with string keys still load
+                self.active_sequences = OrderedDict(
+                    (_ip_key(seq.source_ip), seq) for seq in sequences.values()
+                )
                 print(f"   [LSTM] Loaded {len(self.active_sequences)} active sessions from disk")
             except Exception as e:
                 print(f"   [LSTM] Error loading state: {e}")
+        
+        try:
+            self._reconcile_spilled()
+        except Exception as e:
+            print(f"   [LSTM] Error reconciling spill store: {e}")
+        
+        if self.wal_file.exists():
+            try:
+                replayed, valid_bytes = self._replay_wal(self.wal_file.read_bytes())
+                # Drop a torn final record so new appends stay aligned
+                with open(self.wal_file, 'r+b') as f:
+                    f.truncate(valid_bytes)
+                print(f"   [LSTM] Replayed {replayed} attacks from WAL")
+            except Exception as e:
+                print(f"   [LSTM] Error replaying WAL: {e}")
+        
+        self._evict_cold_sequences()
+    
+    def _reconcile_spilled(self):
+        """
+        Keep the newer of the snapshot and LMDB copies of a sequence
+        
+        A sequence spilled after the snapshot was taken is newer in LMDB;
+        one rehydrated before it still has a stale LMDB record
+        """
+        if self._spill is None or not self.active_sequences:
+            return
+        
+        with self._spill.begin() as txn:
+            for key, sequence in self.active_sequences.items():
+                spill_key = _spill_key(key)
+                record = txn.get(spill_key)
+                if record is None:
+                    continue
+                spilled = pickle.loads(record[SPILL_HEADER.size:])
+                if spilled.wal_seq > sequence.wal_seq:
+                    self.active_sequences[key] = spilled
+                self._stale_spill_keys.add(spill_key)
+    
+    def _replay_wal(self, data):
+        """
+        Re-apply WAL records through the normal add_attack path
+        
+        Returns (records replayed, bytes of whole records). Records a
+        sequence already holds (wal_seq) are skipped, so snapshot and
+        spilled copies can be replayed onto alike
+        """
+        attack_decoder = {code: name for name, code in self.attack_encoder.items()}
+        offset = 0
+        replayed = 0
+        
+        while offset + WAL_RECORD.size <= len(data):
+            timestamp, attack_code, port, ip_len, service_len = WAL_RECORD.unpack_from(data, offset)
+            offset += WAL_RECORD.size
+            end = offset + ip_len + service_len
+            if end > len(data):
+                break  # Torn final record
+            
+            source_ip = data[offset:offset + ip_len].decode(errors='replace')
+            service = data[offset + ip_len:end].decode(errors='replace') if service_len else None
+            offset = end
+            self._event_seq += 1
+            replayed += 1
+            
+            sequence = self._get_sequence(source_ip)
+            if sequence.wal_seq >= self._event_seq:
+                continue
+            sequence.add_attack(
+                attack_decoder.get(attack_code, 'UNKNOWN_THREAT'),
+                timestamp, service, port, attack_code=attack_code
+            )
+            sequence.wal_seq = self._event_seq
+        
+        self._events_since_snapshot = replayed
+        return replayed, offset
     
     def _define_attack_patterns(self):
         """Define known multi-stage attack patterns"""
@@ -217,40 +625,102 @@ class LSTMSequenceAnalyzer:
                 'pattern': ['PORT_SCAN', 'BRUTE_FORCE'],
                 'description': 'Reconnaissance followed by credential attack',
                 'severity': 'HIGH',
-                'kill_chain': ['Reconnaissance', 'Initial Access']
+                'kill_chain': ['Reconnaissance', 'Initial Access'],
+                'flags': PATTERN_RECON
             },
             'reconnaissance_to_infiltration': {
                 'pattern': ['PORT_SCAN', 'WEB_ATTACK', 'INFILTRATION'],
                 'description': 'Full attack chain from recon to infiltration',
                 'severity': 'CRITICAL',
-                'kill_chain': ['Reconnaissance', 'Initial Access', 'Persistence']
+                'kill_chain': ['Reconnaissance', 'Initial Access', 'Persistence'],
+                'flags': PATTERN_RECON | PATTERN_INFILTRATION
             },
             'persistent_brute_force': {
                 'pattern': ['BRUTE_FORCE', 'BRUTE_FORCE', 'BRUTE_FORCE'],
                 'description': 'Sustained credential attack campaign',
                 'severity': 'HIGH',
-                'kill_chain': ['Initial Access']
+                'kill_chain': ['Initial Access'],
+                'flags': 0
             },
             'distributed_attack': {
                 'pattern': ['DOS', 'DDOS'],
                 'description': 'Escalation from single to distributed DoS',
                 'severity': 'CRITICAL',
-                'kill_chain': ['Impact']
+                'kill_chain': ['Impact'],
+                'flags': 0
             },
             'botnet_activity': {
                 'pattern': ['BOTNET', 'DOS'],
                 'description': 'Botnet conducting attacks',
                 'severity': 'CRITICAL',
-                'kill_chain': ['Command and Control', 'Impact']
+                'kill_chain': ['Command and Control', 'Impact'],
+                'flags': PATTERN_BOTNET
             },
             'web_exploitation': {
                 'pattern': ['WEB_ATTACK', 'WEB_ATTACK', 'INFILTRATION'],
                 'description': 'Web exploitation leading to infiltration',
                 'severity': 'CRITICAL',
-                'kill_chain': ['Initial Access', 'Persistence']
+                'kill_chain': ['Initial Access', 'Persistence'],
+                'flags': 0
             }
         }
     
+    def _encode_attack(self, attack_type):
+        """Integer code for an attack type (unknown types -> UNKNOWN_THREAT)"""
+        return self.attack_encoder.get(attack_type, self.attack_encoder['UNKNOWN_THREAT'])
+    
+    def _get_sequence(self, source_ip):
+        """
+        Get or create the attack sequence for a source IP and mark it as
+        most recently active
+        """
+        key = _ip_key(source_ip)
+        sequence = self.active_sequences.get(key)
+        if sequence is not None:
+            self.active_sequences.move_to_end(key)
+            return sequence
+        
+        sequence = self._rehydrate_sequence(key)
+        if sequence is None:
+            # The sequence keeps the one string reference used for reporting
+            sequence = AttackSequence(
+                sys.intern(str(source_ip)),
+                max_length=self.sequence_length,
+                time_window=self.time_window
+            )
+        self.active_sequences[key] = sequence
+        self._evict_cold_sequences()
+        return sequence
+    
+    def _build_pattern_matcher(self):
+        """Compile all attack patterns into a single Aho-Corasick automaton"""
+        self._encoded_patterns = {
+            name: _encode_codes(self._encode_attack(a) for a in info['pattern'])
+            for name, info in self.attack_patterns.items()
+        }
+        
+        if not AHOCORASICK_AVAILABLE:
+            return None
+        
+        automaton = ahocorasick.Automaton()
+        for name, key in self._encoded_patterns.items():
+            automaton.add_word(key, name)
+        automaton.make_automaton()
+        return automaton
+    
+    def _match_patterns(self, sequence):
+        """Names of all known patterns occurring in the sequence"""
+        sequence_key = _encode_codes(sequence.encoded_attacks)
+        
+        if self._pattern_matcher is not None:
+            # One linear walk finds every pattern at once
+            return {name for _, name in self._pattern_matcher.iter(sequence_key)}
+        
+        return {
+            name for name, key in self._encoded_patterns.items()
+            if key in sequence_key
+        }
+    
     def process_attack(self, log_data, attack_type, timestamp):
         """
         Process new attack and update sequence
@@ -258,7 +728,7 @@ class LSTMSequenceAnalyzer:
         Args:
             log_data: Raw log data
             attack_type: Detected attack type
-            timestamp: Attack timestamp
+            timestamp: Attack timestamp (ISO-8601 string or epoch seconds)
             
         Returns:
             Analysis results
@@ -272,23 +742,29 @@ class LSTMSequenceAnalyzer:
         if attack_type == 'NORMAL':
             return None
         
+        try:
+            port = min(max(int(port), 0), 65535)
+        except (TypeError, ValueError):
+            port = 0
+        
         # Get or create sequence for this IP
-        if source_ip not in self.active_sequences:
-            self.active_sequences[source_ip] = AttackSequence(
-                source_ip, 
-                max_length=self.sequence_length,
-                time_window=self.time_window
-            )
+        sequence = self._get_sequence(source_ip)
+        attack_code = self._encode_attack(attack_type)
+        sequence.add_attack(attack_type, timestamp, service, port, attack_code=attack_code)
         
-        sequence = self.active_sequences[source_ip]
-        sequence.add_attack(attack_type, timestamp, service, port)
+        # Persist: O(1) WAL append, full snapshot only periodically
+        self._append_wal(
+            sequence, attack_code, sequence.last_seen / NS_PER_SECOND, service, port
+        )
         
         # Analyze sequence
         analysis = self._analyze_sequence(sequence)
         
-        # Clean up old sequences
-        self._cleanup_old_sequences()
-        self._save_state()
+        # Clean up old sequences (amortized: full sweep once per interval)
+        now_ns = time.time_ns()
+        if now_ns - self._last_cleanup_ns > self._cleanup_interval_ns:
+            self._cleanup_old_sequences(now_ns)
+            self._last_cleanup_ns = now_ns
         
         return analysis
     
@@ -309,10 +785,12 @@ class LSTMSequenceAnalyzer:
             return analysis
         
         # Check for known attack patterns
-        recent_attacks = list(sequence.attacks)
+        matched = self._match_patterns(sequence)
+        flags = 0
         
         for pattern_name, pattern_info in self.attack_patterns.items():
-            if self._matches_pattern(recent_attacks, pattern_info['pattern']):
+            if pattern_name in matched:
+                flags |= pattern_info['flags']
                 analysis['patterns_detected'].append({
                     'name': pattern_name,
                     'description': pattern_info['description'],
@@ -333,29 +811,11 @@ class LSTMSequenceAnalyzer:
         # Generate recommendations
         analysis['recommendations'] = self._generate_recommendations(
             sequence,
-            analysis['patterns_detected']
+            flags
         )
         
         return analysis
     
-    def _matches_pattern(self, attack_sequence, pattern):
-        """Check if attack sequence matches a known pattern"""
-        if len(attack_sequence) < len(pattern):
-            return False
-        
-        # Check last N attacks match pattern
-        recent = attack_sequence[-len(pattern):]
-        
-        # Exact match
-        if recent == pattern:
-            return True
-        
-        # Allow for some flexibility (pattern appears in sequence)
-        pattern_str = '->'.join(pattern)
-        sequence_str = '->'.join(attack_sequence)
-        
-        return pattern_str in sequence_str
-    
     def _calculate_threat_score(self, sequence):
         """Calculate behavioral threat score (0-1)"""
         score = 0.0
@@ -373,17 +833,16 @@ class LSTMSequenceAnalyzer:
         # - Fast attacks (<5s delta) -> Score ~1.0
         # - Medium attacks (10-30s) -> Score ~0.5
         # - Slow/Normal (>60s) -> Score -> 0.0
-        time_deltas = sequence.get_time_deltas()
-        if time_deltas:
-            avg_delta = np.mean(time_deltas)
+        if len(sequence.attacks) >= 2:
+            avg_delta = sequence.get_time_deltas().mean()
             # Sigmoid formula: 1 / (1 + e^((x - threshold) / steepness))
             # Centers decay around 15 seconds
             rate_score = 1 / (1 + np.exp((avg_delta - 15) / 10))
             score += rate_score * 0.3
         
         # Factor 4: Critical attack types present
-        critical_attacks = ['INFILTRATION', 'BOTNET', 'DDOS', 'HEARTBLEED']
-        critical_score = sum(1 for a in sequence.attacks if a in critical_attacks) / max(len(sequence.attacks), 1)
+        codes = np.asarray(sequence.encoded_attacks, dtype=np.uint8)
+        critical_score = np.isin(codes, self._critical_codes).sum() / max(codes.size, 1)
         score += critical_score * 0.2
         
         return min(score, 1.0)
@@ -411,18 +870,17 @@ class LSTMSequenceAnalyzer:
         
         return 'LOW'
     
-    def _generate_recommendations(self, sequence, patterns):
+    def _generate_recommendations(self, sequence, flags):
         """Generate security recommendations"""
         recommendations = []
         
-        # Based on patterns
-        for pattern in patterns:
-            if 'reconnaissance' in pattern['name']:
-                recommendations.append("Block source IP - active reconnaissance detected")
-            if 'infiltration' in pattern['name']:
-                recommendations.append("URGENT: Isolate affected systems - infiltration in progress")
-            if 'botnet' in pattern['name']:
-                recommendations.append("Deploy botnet mitigation - coordinated attack detected")
+        # Based on patterns (flags OR-ed over detected patterns)
+        if flags & PATTERN_RECON:
+            recommendations.append("Block source IP - active reconnaissance detected")
+        if flags & PATTERN_INFILTRATION:
+            recommendations.append("URGENT: Isolate affected systems - infiltration in progress")
+        if flags & PATTERN_BOTNET:
+            recommendations.append("Deploy botnet mitigation - coordinated attack detected")
         
         # Based on sequence characteristics
         if len(sequence.attacks) >= 5:
@@ -436,34 +894,53 @@ class LSTMSequenceAnalyzer:
         
         return recommendations
     
-    def _cleanup_old_sequences(self):
+    def _cleanup_old_sequences(self, now_ns=None):
         """Remove inactive sequences"""
-        # FIXED: Use UTC to match the log timestamps
-        current_time = datetime.now(timezone.utc)
-        
-        cutoff_time = current_time - timedelta(seconds=self.time_window * 2)
+        # Epoch nanoseconds, same clock as the sequence timestamps
+        if now_ns is None:
+            now_ns = time.time_ns()
+        cutoff_time = now_ns - self.time_window * 2 * NS_PER_SECOND
         
         to_remove = []
         for ip, sequence in self.active_sequences.items():
-            if sequence.last_seen and sequence.last_seen < cutoff_time:
+            if sequence.last_seen is not None and sequence.last_seen < cutoff_time:
                 to_remove.append(ip)
         
         for ip in to_remove:
             del self.active_sequences[ip]
+        
+        self._cleanup_spilled_sequences(cutoff_time)
+    
+    def _cleanup_spilled_sequences(self, cutoff_time):
+        """Remove inactive sequences from the spill store (header-only scan)"""
+        if self._spill is None:
+            return
+        
+        try:
+            with self._spill.begin(write=True) as txn:
+                expired = [
+                    spill_key for spill_key, record in txn.cursor()
+                    if SPILL_HEADER.unpack_from(record)[0] < cutoff_time
+                ]
+                for spill_key in expired:
+                    txn.delete(spill_key)
+                    self._stale_spill_keys.discard(spill_key)
+        except Exception as e:
+            print(f"   [LSTM] Error cleaning spill store: {e}")
     
     def get_active_attackers(self):
-        """Get list of currently active attackers"""
+        """Get list of currently active (in-memory) attackers"""
         return {
-            ip: seq.get_statistics() 
-            for ip, seq in self.active_sequences.items()
+            seq.source_ip: seq.get_statistics() 
+            for seq in self.active_sequences.values()
             if len(seq.attacks) > 0
         }
     
     def get_top_attackers(self, n=10):
         """Get top N most active attackers"""
         attackers = []
-        for ip, seq in self.active_sequences.items():
-            stats = seq.get_statistics()
+        for seq in self.active_sequences.values():
+            stats = dict(seq.get_statistics())
             stats['threat_score'] = self._calculate_threat_score(seq)
             attackers.append(stats)
         
@@ -476,7 +953,7 @@ class LSTMSequenceAnalyzer:
         """Generate report on detected attack campaigns"""
         report = {
             'timestamp': datetime.now().isoformat(),
-            'total_active_attackers': len(self.active_sequences),
+            'total_active_attackers': len(self.active_sequences) + self._spilled_count(),
             'top_attackers': self.get_top_attackers(5),
             'attack_patterns_detected': [],
             'recommendations': []
@@ -3,20 +3,20 @@ PALADIN - CIC-IDS2017 Dataset Preprocessing
 File: log_pipeline/consumer/training/preprocess_cic.py
 
 Prepares CIC-IDS2017 for training:
-1. Loads all CSV files
+1. Loads all CSV files (pyarrow)
 2. Cleans data (NaN, infinity)
 3. Balances classes
-4. Creates train/val/test splits
+4. Creates train/val/test splits (Parquet, float32)
 """
 
-import pandas as pd
 import numpy as np
-import os
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.compute as pc
 from pathlib import Path
 import json
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
-from sklearn.utils import resample
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -33,6 +33,28 @@ PROCESSED_DATA_DIR.mkdir(parents=True, exist_ok=True)
 SAMPLE_BENIGN = 50000  # Limit benign samples
 RANDOM_STATE = 42
 
+# Features kept for training (normalized column names)
+SELECTED_FEATURES = [
+    'destination_port', 'protocol', 'flow_duration',
+    'total_fwd_packets', 'total_backward_packets',
+    'flow_bytes/s', 'flow_packets/s', 'flow_iat_mean',
+    'fwd_iat_mean', 'syn_flag_count', 'ack_flag_count',
+    'average_packet_size', 'avg_fwd_segment_size'
+]
+LABEL_COL = 'label'
+
+
+def normalize_column(name):
+    """' Flow Bytes/s' -> 'flow_bytes/s'"""
+    return name.strip().lower().replace(' ', '_')
+
+
+def read_header(csv_file):
+    """Raw column names from the first line of a CSV"""
+    with open(csv_file, encoding='utf-8') as f:
+        return f.readline().rstrip('\r\n').split(',')
+
+
 # Attack category mapping
 ATTACK_MAPPING = {
     'BENIGN': 'NORMAL',
@@ -62,28 +84,54 @@ if not csv_files:
 
 print(f"✅ Found {len(csv_files)} files")
 
-# Load all CSVs
-dfs = []
+# Load all CSVs with Arrow's multithreaded reader, keeping only the
+# selected features plus the label so unused columns are never materialized
+tables = []
 for csv_file in csv_files:
     print(f"   Loading {csv_file.name}...", end='')
-    df = pd.read_csv(csv_file, encoding='utf-8', low_memory=False)
-    df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-    dfs.append(df)
-    print(f" {len(df):,} rows")
-
-df_combined = pd.concat(dfs, ignore_index=True)
-print(f"✅ Total: {len(df_combined):,} rows")
-
-# Find label column
-label_cols = [col for col in df_combined.columns if 'label' in col.lower()]
-LABEL_COL = label_cols[0] if label_cols else None
-if not LABEL_COL:
+    raw_columns = read_header(csv_file)
+    keep = {}
+    for raw in raw_columns:
+        name = normalize_column(raw)
+        if name in SELECTED_FEATURES:
+            keep[raw] = pa.float64()
+        elif name == LABEL_COL:
+            keep[raw] = pa.string()
+    
+    table = pacsv.read_csv(
+        csv_file,
+        convert_options=pacsv.ConvertOptions(
+            column_types=keep,
+            include_columns=list(keep)
+        )
+    )
+    table = table.rename_columns([normalize_column(c) for c in table.column_names])
+    tables.append(table.select(sorted(table.column_names)))
+    print(f" {table.num_rows:,} rows")
+
+# Zero-copy when all files share the same schema
+combined = pa.concat_tables(tables)
+del tables
+print(f"✅ Total: {combined.num_rows:,} rows")
+
+if LABEL_COL not in combined.column_names:
     print("❌ No label column found!")
     exit(1)
 
 print(f"\n📊 Attack Distribution:")
-for label, count in df_combined[LABEL_COL].value_counts().items():
-    print(f"   {label:30s}: {count:>8,}")
+label_counts = pc.value_counts(combined[LABEL_COL]).to_pylist()
+for entry in sorted(label_counts, key=lambda e: e['counts'], reverse=True):
+    print(f"   {entry['values']:30s}: {entry['counts']:>8,}")
+
+# Map attack labels (unknown labels -> OTHER)
+label_index = pc.index_in(combined[LABEL_COL], value_set=pa.array(list(ATTACK_MAPPING)))
+categories = pc.take(pa.array(list(ATTACK_MAPPING.values())), label_index)
+combined = combined.drop([LABEL_COL]).append_column(
+    'attack_category', pc.fill_null(categories, 'OTHER')
+)
+
+df_combined = combined.to_pandas()
+del combined
 
 # Clean data
 print(f"\n🧹 Cleaning data...")
@@ -91,65 +139,44 @@ df_combined.fillna(0, inplace=True)
 df_combined.replace([np.inf, -np.inf], 0, inplace=True)
 print("   ✅ Cleaned NaN and infinity values")
 
-# Map attack labels
-df_combined['attack_category'] = df_combined[LABEL_COL].map(ATTACK_MAPPING)
-df_combined['attack_category'].fillna('OTHER', inplace=True)
-
 print(f"\n🏷️  Categories:")
 for cat, count in df_combined['attack_category'].value_counts().items():
     print(f"   {cat:20s}: {count:>8,}")
 
 
 
-# Step 1: Limit benign
-df_benign = df_combined[df_combined['attack_category'] == 'NORMAL']
-if len(df_benign) > SAMPLE_BENIGN:
-    df_benign = df_benign.sample(n=SAMPLE_BENIGN, random_state=RANDOM_STATE)
-
-# Step 2: Balance attack types
-df_attacks = df_combined[df_combined['attack_category'] != 'NORMAL']
-
 # Set target samples per attack type
 TARGET_SAMPLES_PER_CLASS = 10000  # Adjust based on smallest class
 
-balanced_dfs = [df_benign]  # Start with benign
+# Balance by drawing row positions per class, then gather once
+groups = df_combined.groupby('attack_category').indices
+rng = np.random.default_rng(RANDOM_STATE)
+picks = []
+
+# Step 1: Limit benign
+benign_idx = groups.get('NORMAL', np.empty(0, dtype=np.int64))
+picks.append(rng.choice(benign_idx, min(len(benign_idx), SAMPLE_BENIGN), replace=False))
 
-for attack_type in df_attacks['attack_category'].unique():
-    df_attack = df_attacks[df_attacks['attack_category'] == attack_type]
+# Step 2: Balance attack types
+for attack_type, idx in groups.items():
+    if attack_type == 'NORMAL':
+        continue
     
-    # Oversample small classes, undersample large ones
-    if len(df_attack) < TARGET_SAMPLES_PER_CLASS:
-        # Oversample (duplicate with replacement)
-        df_resampled = resample(df_attack, 
-                                n_samples=TARGET_SAMPLES_PER_CLASS, 
-                                replace=True,  # Allow duplicates
-                                random_state=RANDOM_STATE)
-        print(f"   ⬆️  {attack_type:20s}: {len(df_attack):>7,} → {TARGET_SAMPLES_PER_CLASS:>7,} (oversampled)")
+    # Oversample small classes (with replacement), undersample large ones
+    oversample = len(idx) < TARGET_SAMPLES_PER_CLASS
+    picks.append(rng.choice(idx, TARGET_SAMPLES_PER_CLASS, replace=oversample))
+    if oversample:
+        print(f"   ⬆️  {attack_type:20s}: {len(idx):>7,} → {TARGET_SAMPLES_PER_CLASS:>7,} (oversampled)")
     else:
-        # Undersample (random sample)
-        df_resampled = resample(df_attack, 
-                                n_samples=TARGET_SAMPLES_PER_CLASS, 
-                                replace=False,
-                                random_state=RANDOM_STATE)
-        print(f"   ⬇️  {attack_type:20s}: {len(df_attack):>7,} → {TARGET_SAMPLES_PER_CLASS:>7,} (undersampled)")
-    
-    balanced_dfs.append(df_resampled)
+        print(f"   ⬇️  {attack_type:20s}: {len(idx):>7,} → {TARGET_SAMPLES_PER_CLASS:>7,} (undersampled)")
 
-df_balanced = pd.concat(balanced_dfs, ignore_index=True)
+df_balanced = df_combined.iloc[np.concatenate(picks)].reset_index(drop=True)
+del df_combined
 print(f"\n⚖️  Final balanced dataset: {len(df_balanced):,} samples")
 
 
 # Select features
-SELECTED_FEATURES = [
-    'destination_port', 'protocol', 'flow_duration',
-    'total_fwd_packets', 'total_backward_packets',
-    'flow_bytes/s', 'flow_packets/s', 'flow_iat_mean',
-    'fwd_iat_mean', 'syn_flag_count', 'ack_flag_count',
-    'average_packet_size', 'avg_fwd_segment_size',
-    'attack_category'
-]
-
-available = [f for f in SELECTED_FEATURES if f in df_balanced.columns]
+available = [f for f in SELECTED_FEATURES if f in df_balanced.columns] + ['attack_category']
 df_final = df_balanced[available].copy()
 
 print(f"\n🎯 Features: {len(available)-1} selected")
@@ -172,18 +199,18 @@ X_val, X_test, y_val, y_test = train_test_split(
 print(f"\n✂️  Splits:")
 print(f"   Train: {len(X_train):,} | Val: {len(X_val):,} | Test: {len(X_test):,}")
 
-# Save
-train_df = X_train.copy()
-train_df['label'] = y_train
-train_df.to_csv(PROCESSED_DATA_DIR / 'train_balanced.csv', index=False)
-
-val_df = X_val.copy()
-val_df['label'] = y_val
-val_df.to_csv(PROCESSED_DATA_DIR / 'val_balanced.csv', index=False)
-
-test_df = X_test.copy()
-test_df['label'] = y_test
-test_df.to_csv(PROCESSED_DATA_DIR / 'test_balanced.csv', index=False)
+# Save as Parquet with float32 features (compact, no re-parsing on load)
+for split_name, X_split, y_split in [('train', X_train, y_train),
+                                     ('val', X_val, y_val),
+                                     ('test', X_test, y_test)]:
+    split_df = X_split.astype(np.float32)
+    split_df['label'] = y_split
+    split_df.to_parquet(
+        PROCESSED_DATA_DIR / f'{split_name}_balanced.parquet',
+        engine='pyarrow',
+        compression='snappy',
+        index=False
+    )
 
 with open(PROCESSED_DATA_DIR / 'label_mapping.json', 'w') as f:
     json.dump(label_mapping, f, indent=2)
@@ -1,6 +1,6 @@
-import socket
-import json
-from datetime import datetime
+import asyncio
+import re
+from honeypot_common import open_event_log, run_server, utc_timestamp
 
 # --- CONFIGURATION ---
 HOST = '0.0.0.0'
@@ -12,90 +12,100 @@ RESP_WELCOME = b'220 (ftpd-fake 1.0) Service ready.\r\n'
 RESP_LOGIN_OK = b'230 User logged in, proceed.\r\n'
 RESP_CMD_OK = b'200 Command okay.\r\n'
 RESP_LOGIN_FAIL = b'530 Not logged in.\r\n'
+RESP_NEED_PASS = b'331 User name okay, need password.\r\n'
+RESP_GOODBYE = b'221 Goodbye.\r\n'
 
-def log_event(event_data):
-    """Writes a standardized JSON event to the shared log file."""
-    with open(LOG_FILE, 'a+') as f:
-        json.dump(event_data, f)
-        f.write('\n')
+# Command line on raw bytes: verb, then the optional argument
+COMMAND_RE = re.compile(rb'^\s*([A-Za-z]{3,4})(?:\s+(.*?))?\s*$')
+MAX_LINE = 8192
+
+log_event = open_event_log(LOG_FILE)
+
+# Events share these fields; only the per-event ones are built per call
+_BASE = {"destination_port": PORT, "honeypot_name": "ftp-honeypot", "service": "FTP"}
 
 def create_log_entry(addr, command, detail_data):
     """Constructs the log entry following the team's agreed-upon format."""
-    now_utc = datetime.utcnow().isoformat() + 'Z'
-
-    log_entry = {
-        "timestamp": now_utc,
+    return {
+        "timestamp": utc_timestamp(),
         "source_ip": addr[0],
         "source_port": addr[1],
-        "destination_port": PORT,
-        "honeypot_name": "ftp-honeypot",
-        "service": "FTP",
+        **_BASE,
         "event_type": command,
         "details": detail_data
     }
-    return log_entry
-
-def handle_connection(conn, addr):
-    # Create a file-like object for easier line-by-line reading
-    makefile = conn.makefile('rw', encoding='utf-8', errors='ignore', newline='\r\n')
-    
-    makefile.write('220 (ftpd-fake 1.0) Service ready.\r\n')
-    makefile.flush()
-    username = None
-
-    while True:
-        try:
-            line = makefile.readline().strip()
-            if not line:
-                break
 
-            command_line = line.upper().split()
-            if not command_line:
-                continue
-            
-            command = command_line[0]
-            arg = " ".join(command_line[1:]) if len(command_line) > 1 else ""
-
-            if command == 'USER':
-                username = arg
-                makefile.write('331 User name okay, need password.\r\n')
-            elif command == 'PASS':
-                password = arg
-                if username:
-                    log_entry = create_log_entry(addr, "LOGIN_ATTEMPT", {"username": username, "password": password})
-                    log_event(log_entry)
-                    makefile.write('230 User logged in, proceed.\r\n')
-                    username = f"{username}/{password}"
-                else:
-                    makefile.write('530 Not logged in.\r\n')
-            elif command in ['STOR', 'RETR', 'GET', 'PUT']:
-                log_entry = create_log_entry(addr, "FILE_TRANSFER_ATTEMPT", {"command": command, "file": arg, "authenticated_as": username})
-                log_event(log_entry)
-                makefile.write('200 Command okay.\r\n')
-            elif command == 'QUIT':
-                makefile.write('221 Goodbye.\r\n')
+def _decode(arg):
+    return arg.decode('utf-8', errors='ignore')
+
+def _user(ctx, command, arg):
+    ctx['username'] = _decode(arg)
+    return RESP_NEED_PASS
+
+def _pass(ctx, command, arg):
+    username = ctx['username']
+    if not username:
+        return RESP_LOGIN_FAIL
+    password = _decode(arg)
+    log_event(create_log_entry(ctx['addr'], "LOGIN_ATTEMPT", {"username": username, "password": password}))
+    ctx['username'] = f"{username}/{password}"
+    return RESP_LOGIN_OK
+
+def _transfer(ctx, command, arg):
+    log_event(create_log_entry(ctx['addr'], "FILE_TRANSFER_ATTEMPT", {
+        "command": command.decode(), "file": _decode(arg), "authenticated_as": ctx['username']
+    }))
+    return RESP_CMD_OK
+
+def _quit(ctx, command, arg):
+    ctx['done'] = True
+    return RESP_GOODBYE
+
+def _unknown(ctx, command, arg):
+    return RESP_CMD_OK
+
+HANDLERS = {
+    b'USER': _user,
+    b'PASS': _pass,
+    b'STOR': _transfer,
+    b'RETR': _transfer,
+    b'GET': _transfer,
+    b'PUT': _transfer,
+    b'QUIT': _quit,
+}
+
+def handle_line(ctx, line):
+    """Dispatch one command line (without CRLF); returns the reply bytes."""
+    match = COMMAND_RE.match(line)
+    if match is None:
+        return RESP_CMD_OK
+    command = match.group(1).upper()
+    return HANDLERS.get(command, _unknown)(ctx, command, match.group(2) or b'')
+
+async def handle_connection(reader, writer):
+    addr = writer.get_extra_info('peername')
+    print(f"[*] Connection from {addr[0]} on FTP")
+    ctx = {'addr': addr, 'username': None, 'done': False}
+
+    try:
+        writer.write(RESP_WELCOME)
+        await writer.drain()
+        while not ctx['done']:
+            line = (await reader.readuntil(b'\r\n'))[:-2]
+            if not line or line.isspace():
                 break
-            else:
-                makefile.write('200 Command okay.\r\n')
-            
-            makefile.flush()
+            writer.write(handle_line(ctx, line))
+            await writer.drain()
 
-        except Exception as e:
-            print(f"Error handling FTP connection: {e}")
-            break
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    except Exception as e:
+        print(f"Error handling FTP connection: {e}")
+    finally:
+        writer.close()
 
 def start_server():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        s.listen(5)
-        print(f"[*] FTP Honeypot listening on {HOST}:{PORT}. Logs to {LOG_FILE}")
-
-        while True:
-            conn, addr = s.accept()
-            with conn:
-                print(f"[*] Connection from {addr[0]} on FTP")
-                handle_connection(conn, addr)
+    run_server(handle_connection, HOST, PORT, 'FTP', LOG_FILE, limit=MAX_LINE)
 
 if __name__ == '__main__':
     start_server()
\ No newline at end of file
@@ -0,0 +1,59 @@
+import asyncio
+import os
+import time
+import traceback
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+
+# Shared by the FTP, HTTP and SMTP honeypots (one image, one module)
+DEBUG = bool(os.environ.get('DEBUG'))
+
+def open_event_log(log_file):
+    """Opens log_file for JSON-lines events and returns the log_event(event_data) function."""
+    # One unbuffered append handle per process: each event is a single write().
+    # A single writer thread keeps file I/O off the event loop and lines in order.
+    log_fh = open(log_file, 'ab', buffering=0)
+    writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='log-writer')
+
+    def write_line(line):
+        if DEBUG:
+            print(f"[DEBUG] Attempting to log event to {log_file}")
+        try:
+            log_fh.write(line)
+            if DEBUG:
+                print(f"[DEBUG] Log successful.")
+
+        except Exception as log_e:
+            # Nothing awaits the future, so the failure is reported here (Docker logs)
+            print(f"[!!] FAILED TO WRITE LOG: {log_e}")
+            traceback.print_exc()
+
+    def log_event(event_data):
+        """Queues a standardized JSON event for the shared log file."""
+        writer.submit(write_line, orjson.dumps(event_data, option=orjson.OPT_APPEND_NEWLINE))
+
+    return log_event
+
+# strftime runs once per second; events within it only add milliseconds
+_ts_second = None
+_ts_prefix = ''
+
+def utc_timestamp():
+    """ISO-8601 UTC timestamp with millisecond precision, e.g. 2024-12-06T10:00:00.123Z"""
+    global _ts_second, _ts_prefix
+    second, ns = divmod(time.time_ns(), 1_000_000_000)
+    if second != _ts_second:
+        _ts_prefix = time.strftime('%Y-%m-%dT%H:%M:%S', time.gmtime(second))
+        _ts_second = second
+    return f"{_ts_prefix}.{ns // 1_000_000:03d}Z"
+
+def run_server(handle_connection, host, port, service, log_file, limit=2 ** 16):
+    """Serves handle_connection(reader, writer) for every client on one event loop."""
+    async def serve():
+        # A stalled client only parks its own task, not the other sessions
+        server = await asyncio.start_server(handle_connection, host, port, limit=limit)
+        print(f"[*] {service} Honeypot listening on {host}:{port}. Logs to {log_file}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(serve())
@@ -1,6 +1,4 @@
-import socket
-import json
-from datetime import datetime
+from honeypot_common import open_event_log, run_server, utc_timestamp
 
 # --- CONFIGURATION ---
 HOST = '0.0.0.0'
@@ -10,25 +8,13 @@ LOG_FILE = '/shared_logs/http_honeypot.json'
 # Standard response to appear as a regular web server
 STANDARD_RESPONSE = b'HTTP/1.1 200 OK\r\nServer: Apache/2.4.29\r\nContent-Type: text/html\r\n\r\n<h1>Welcome to the Honeypot!</h1>'
 
-def log_event(event_data):
-    """Writes a standardized JSON event to the shared log file."""
-    print(f"[DEBUG] Attempting to log event to {LOG_FILE}")
-    try:
-        with open(LOG_FILE, 'a+') as f:
-            json.dump(event_data, f)
-            f.write('\n')
-            f.flush()
-        print(f"[DEBUG] Log successful.")
+log_event = open_event_log(LOG_FILE)
 
-    except Exception as log_e:
-        # If the file write fails, this prints the error directly to the Docker logs.
-        import traceback
-        print(f"[!!] FAILED TO WRITE LOG: {log_e}")
-        traceback.print_exc()
+# Events share these fields; only the per-event ones are built per call
+_BASE = {"destination_port": PORT, "honeypot_name": "http-honeypot", "service": "HTTP"}
 
 def create_log_entry(addr, request):
     """Constructs the log entry following the team's agreed-upon format."""
-    now_utc = datetime.utcnow().isoformat() + 'Z'
     request_lines = request.split('\r\n')
     
     # Extract method and path from the first line
@@ -37,12 +23,10 @@ def create_log_entry(addr, request):
     path = first_line_parts[1] if len(first_line_parts) > 1 else "/"
 
     return {
-        "timestamp": now_utc,
+        "timestamp": utc_timestamp(),
         "source_ip": addr[0],
         "source_port": addr[1],
-        "destination_port": PORT,
-        "honeypot_name": "http-honeypot",
-        "service": "HTTP",
+        **_BASE,
         "event_type": "REQUEST",
         "details": {
             "method": method,
@@ -52,32 +36,29 @@ def create_log_entry(addr, request):
         }
     }
 
+async def handle_connection(reader, writer):
+    addr = writer.get_extra_info('peername')
+    print(f"[*] Connection from {addr[0]}")
+    try:
+        # Receive data (up to 1KB)
+        request_data = (await reader.read(1024)).decode('utf-8', errors='ignore').strip()
+
+        if request_data:
+            # Log the event
+            log_entry = create_log_entry(addr, request_data)
+            log_event(log_entry)
+
+            # Send the fake response
+            writer.write(STANDARD_RESPONSE)
+            await writer.drain()
+
+    except Exception as e:
+        print(f"Error handling connection: {e}")
+    finally:
+        writer.close()
+
 def start_server():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        # Allow the port to be immediately reused
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        s.listen(5)
-        print(f"[*] HTTP Honeypot listening on {HOST}:{PORT}. Logs to {LOG_FILE}")
-        
-        while True:
-            conn, addr = s.accept()
-            with conn:
-                print(f"[*] Connection from {addr[0]}")
-                try:
-                    # Receive data (up to 1KB)
-                    request_data = conn.recv(1024).decode('utf-8', errors='ignore').strip()
-                    
-                    if request_data:
-                        # Log the event
-                        log_entry = create_log_entry(addr, request_data)
-                        log_event(log_entry)
-                        
-                        # Send the fake response
-                        conn.sendall(STANDARD_RESPONSE)
-                    
-                except Exception as e:
-                    print(f"Error handling connection: {e}")
+    run_server(handle_connection, HOST, PORT, 'HTTP', LOG_FILE)
 
 if __name__ == '__main__':
     start_server()
\ No newline at end of file
@@ -1,6 +1,6 @@
-import socket
-import json
-from datetime import datetime
+import asyncio
+import re
+from honeypot_common import open_event_log, run_server, utc_timestamp
 
 # --- CONFIGURATION ---
 HOST = '0.0.0.0'
@@ -14,96 +14,135 @@ RESP_DATA_START = b'354 Start mail input; end with <CRLF>.<CRLF>\r\n'
 RESP_GOODBYE = b'221 Bye\r\n'
 RESP_SYNTAX_ERROR = b'500 Syntax error, command unrecognised\r\n'
 
-def log_event(event_data):
-    """Writes a standardized JSON event to the shared log file."""
-    with open(LOG_FILE, 'a+') as f:
-        json.dump(event_data, f)
-        f.write('\n')
+# Command line on raw bytes: verb, then whatever follows the first ':'
+COMMAND_RE = re.compile(rb'^\s*([A-Za-z]{3,4})\b[^:]*(?::\s*(.*?))?\s*$')
+MAX_LINE = 8192
+BODY_SNIPPET_BYTES = 400
+
+log_event = open_event_log(LOG_FILE)
+
+# Events share these fields; only the per-event ones are built per call
+_BASE = {"destination_port": PORT, "honeypot_name": "smtp-honeypot", "service": "SMTP"}
 
 def create_log_entry(addr, command, detail_data):
     """Constructs the log entry following the team's agreed-upon format."""
-    now_utc = datetime.utcnow().isoformat() + 'Z'
-
-    log_entry = {
-        "timestamp": now_utc,
+    return {
+        "timestamp": utc_timestamp(),
         "source_ip": addr[0],
         "source_port": addr[1],
-        "destination_port": PORT,
-        "honeypot_name": "smtp-honeypot",
-        "service": "SMTP",
+        **_BASE,
         "event_type": command,
         "details": detail_data
     }
-    return log_entry
 
-def handle_connection(conn, addr):
-    # Create a file-like object for easier line-by-line reading
-    makefile = conn.makefile('rw', encoding='utf-8', errors='ignore', newline='\r\n')
+def _decode(arg):
+    return arg.decode('utf-8', errors='ignore') if arg is not None else "UNKNOWN"
 
-    makefile.write('220 mail.honeypot.net ESMTP Service ready\r\n')
-    makefile.flush()
-    mail_from = None
-    mail_to = []
+def _quit(ctx, command, arg):
+    ctx['done'] = True
+    return RESP_GOODBYE
 
-    while True:
-        try:
-            line = makefile.readline().strip()
-            if not line:
-                break
+def _mail(ctx, command, arg):
+    ctx['mail_from'] = _decode(arg)
+    return RESP_OK
+
+def _rcpt(ctx, command, arg):
+    ctx['mail_to'].append(_decode(arg))
+    return RESP_OK
+
+def _data(ctx, command, arg):
+    ctx['body'] = bytearray()
+    return RESP_DATA_START
+
+def _ok(ctx, command, arg):
+    return RESP_OK
 
-            command_line = line.upper().split(':', 1)
-            command = command_line[0].split()[0]
+def _unknown(ctx, command, arg):
+    return RESP_SYNTAX_ERROR
 
-            if command == 'QUIT':
-                makefile.write('221 Bye\r\n')
+HANDLERS = {
+    b'QUIT': _quit,
+    b'MAIL': _mail,
+    b'RCPT': _rcpt,
+    b'DATA': _data,
+    b'HELO': _ok,
+    b'EHLO': _ok,
+    b'VRFY': _ok,
+}
+
+def handle_body_line(ctx, line, complete=True):
+    """
+    Collects one DATA line; returns the reply once the terminating '.' arrives.
+    complete=False passes a fragment of a body line longer than MAX_LINE.
+    """
+    body = ctx['body']
+    # Only the head of the message is logged, so stop buffering past it
+    if len(body) < BODY_SNIPPET_BYTES:
+        body += line
+        if complete:
+            body += b'\r\n'
+    # The tail of a split line is never the terminator
+    continued = ctx['partial']
+    ctx['partial'] = not complete
+    if continued or not complete or line.strip() != b'.':
+        return None
+
+    ctx['body'] = None
+    snippet = body[:BODY_SNIPPET_BYTES].decode('utf-8', errors='ignore')[:100]
+    log_event(create_log_entry(ctx['addr'], "EMAIL_RECEIVED", {
+        "from": ctx['mail_from'],
+        "to": ctx['mail_to'],
+        "body_snippet": snippet.replace('\n', ' ').strip() + "..."
+    }))
+    return RESP_OK
+
+def handle_line(ctx, line):
+    """Dispatch one command line (without CRLF); returns the reply bytes."""
+    match = COMMAND_RE.match(line)
+    if match is None:
+        return RESP_SYNTAX_ERROR
+    command = match.group(1).upper()
+    return HANDLERS.get(command, _unknown)(ctx, command, match.group(2))
+
+async def handle_connection(reader, writer):
+    addr = writer.get_extra_info('peername')
+    print(f"[*] Connection from {addr[0]} on SMTP")
+    ctx = {'addr': addr, 'mail_from': None, 'mail_to': [], 'body': None, 'partial': False, 'done': False}
+
+    try:
+        writer.write(RESP_WELCOME)
+        await writer.drain()
+        while not ctx['done']:
+            try:
+                line = (await reader.readuntil(b'\r\n'))[:-2]
+            except asyncio.LimitOverrunError as e:
+                # Command lines stay capped; message bodies may carry longer lines
+                if ctx['body'] is None:
+                    break
+                handle_body_line(ctx, await reader.readexactly(e.consumed), complete=False)
+                continue
+
+            if ctx['body'] is not None:
+                response = handle_body_line(ctx, line)
+                if response is None:
+                    continue
+            elif not line or line.isspace():
                 break
-            elif command == 'MAIL':
-                mail_from = command_line[1].strip() if len(command_line) > 1 else "UNKNOWN"
-                makefile.write('250 OK\r\n')
-            elif command == 'RCPT':
-                mail_to.append(command_line[1].strip() if len(command_line) > 1 else "UNKNOWN")
-                makefile.write('250 OK\r\n')
-            elif command == 'DATA':
-                makefile.write('354 Start mail input; end with <CRLF>.<CRLF>\r\n')
-                makefile.flush()
-                
-                email_body = ""
-                while True:
-                    body_line = makefile.readline()
-                    email_body += body_line
-                    if body_line.strip() == '.':
-                        break
-                
-                log_entry = create_log_entry(addr, "EMAIL_RECEIVED", {
-                    "from": mail_from, 
-                    "to": mail_to,
-                    "body_snippet": email_body[:100].replace('\n', ' ').strip() + "..."
-                })
-                log_event(log_entry)
-                makefile.write('250 OK\r\n')
-            elif command in ['HELO', 'EHLO', 'VRFY']:
-                makefile.write('250 OK\r\n')
             else:
-                makefile.write('500 Syntax error, command unrecognised\r\n')
-            
-            makefile.flush()
+                response = handle_line(ctx, line)
+
+            writer.write(response)
+            await writer.drain()
 
-        except Exception as e:
-            print(f"Error handling SMTP connection: {e}")
-            break
+    except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+        pass
+    except Exception as e:
+        print(f"Error handling SMTP connection: {e}")
+    finally:
+        writer.close()
 
 def start_server():
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-        s.bind((HOST, PORT))
-        s.listen(5)
-        print(f"[*] SMTP Honeypot listening on {HOST}:{PORT}. Logs to {LOG_FILE}")
-
-        while True:
-            conn, addr = s.accept()
-            with conn:
-                print(f"[*] Connection from {addr[0]} on SMTP")
-                handle_connection(conn, addr)
+    run_server(handle_connection, HOST, PORT, 'SMTP', LOG_FILE, limit=MAX_LINE)
 
 if __name__ == '__main__':
     start_server()
\ No newline at end of file
@@ -1,5 +1,6 @@
+import os
 import redis
-import json
+import orjson
 import datetime
 import time
 import random
@@ -8,9 +9,12 @@ import random
 REDIS_HOST = 'localhost' # Use 'localhost' if running from host, 'redis' if inside docker
 REDIS_PORT = 6379
 QUEUE_NAME = 'honeypot-logs'
+# Set to e.g. 100000 to replay a sustained flood after the demo sequence
+FLOOD_EVENTS = int(os.environ.get('PALADIN_FLOOD_EVENTS', 0))
+FLOOD_BATCH = 1000
 
-def send_log(r, attack_type, service, port, ip):
-    """Constructs a log designed to trigger specific ML classifications"""
+def send_log(pipe, attack_type, service, port, ip, verbose=True):
+    """Queues a log designed to trigger specific ML classifications on a Redis pipeline"""
     
     # DoS Signature: Massive packets, tiny duration, repetitive message
     if attack_type == "DOS":
@@ -39,8 +43,9 @@ def send_log(r, attack_type, service, port, ip):
             "protocol": "tcp"
         }
 
-    r.rpush(QUEUE_NAME, json.dumps(log))
-    print(f"💣 Sent {attack_type} payload from {ip}")
+    pipe.rpush(QUEUE_NAME, orjson.dumps(log))
+    if verbose:
+        print(f"💣 Queued {attack_type} payload from {ip}")
 
 def main():
     try:
@@ -53,19 +58,36 @@ def main():
 
     attacker_ip = "192.168.66.6" # The "Evil" IP
 
+    # Paced phases send each log as it is queued; only the flood batches round-trips
+    pipe = r.pipeline(transaction=False)
+
     # PHASE 1: Rapid Reconnaissance (Sets the stage)
     print("\n--- PHASE 1: Warming up LSTM (Reconnaissance) ---")
     for port in [80, 443, 8080]:
-        send_log(r, "PORT_SCAN", "HTTP", port, attacker_ip)
+        send_log(pipe, "PORT_SCAN", "HTTP", port, attacker_ip)
+        pipe.execute()
         time.sleep(0.2)
 
     # PHASE 2: The Critical DoS Flood
     print("\n--- PHASE 2: LAUNCHING CRITICAL DoS FLOOD ---")
     # Sending multiple to ensure LSTM sees the "Sequence" and volume
     for _ in range(4):
-        send_log(r, "DOS", "HTTP", 80, attacker_ip)
+        send_log(pipe, "DOS", "HTTP", 80, attacker_ip)
+        pipe.execute()
         time.sleep(0.5)
 
+    # PHASE 3 (optional): Sustained flood, no pacing, FLOOD_BATCH pushes per round-trip
+    if FLOOD_EVENTS:
+        print(f"\n--- PHASE 3: REPLAYING {FLOOD_EVENTS:,} DoS EVENTS ---")
+        start = time.perf_counter()
+        for i in range(1, FLOOD_EVENTS + 1):
+            send_log(pipe, "DOS", "HTTP", 80, attacker_ip, verbose=False)
+            if i % FLOOD_BATCH == 0:
+                pipe.execute()
+        pipe.execute()
+        elapsed = time.perf_counter() - start
+        print(f"💣 Sent {FLOOD_EVENTS:,} events in {elapsed:.2f}s ({FLOOD_EVENTS/elapsed:,.0f}/s)")
+
     print("\n✅ Simulation Complete. Check Consumer logs for RED ALERTS.")
 
 if __name__ == "__main__":